@@ -7,7 +7,16 @@ from logging.handlers import RotatingFileHandler
 from flask import Flask, render_template
 from flask_login import LoginManager
 from config import config
-from app.models import db, User
+from app.models import User
+from app.database import init_database
+from app.search import init_search
+from app.audit import audit_writer
+from app.cache import cache
+from app.metrics import server_sampler
+from app.metrics_store import metrics_store
+from app.scheduler import job_scheduler
+from app.job_lease import lease_manager
+from app.online import online_tracker
 
 login_manager = LoginManager()
 
@@ -53,8 +62,41 @@ def ensure_directories(app):
 
 def init_extensions(app):
     """初始化Flask扩展"""
-    # 初始化数据库
-    db.init_app(app)
+    # 初始化数据库(SQLite连接参数和连接池)
+    init_database(app)
+    
+    # 为已有数据库补建新增的表、列和索引
+    if app.config.get('DATABASE_AUTO_UPGRADE', True):
+        from app.migrate import upgrade_database
+        upgrade_database(app)
+    
+    # 用户/角色/岗位搜索的全文索引
+    init_search(app)
+    
+    # 注册数据版本监听(缓存失效)
+    from app.versions import register_version_listeners
+    register_version_listeners()
+    
+    # 初始化两级缓存(配置共享缓存时跨进程失效)
+    cache.init_app(app)
+    
+    # 预加载参数快照
+    from app.sysconfig import init_configs
+    init_configs(app)
+    
+    # 初始化审计日志异步写入
+    audit_writer.init_app(app)
+    
+    # 初始化服务器指标采样
+    server_sampler.init_app(app)
+    
+    # 初始化指标历史存储(由采样线程写入)
+    metrics_store.init_app(app)
+    server_sampler.add_listener(metrics_store.record)
+    
+    # 初始化定时任务调度器(由run.py启动)
+    job_scheduler.init_app(app)
+    lease_manager.init_app(app)
     
     # 初始化登录管理器
     login_manager.init_app(app)
@@ -62,6 +104,17 @@ def init_extensions(app):
     login_manager.login_message = '请先登录系统'
     login_manager.session_protection = 'strong'
     
+    # 初始化在线会话跟踪(访问时间批量更新、过期清理、强退)
+    online_tracker.init_app(app)
+    
+    # 静态资源哈希文件名、预压缩和长期缓存
+    from app.assets import assets
+    assets.init_app(app)
+    
+    # JSON响应压缩
+    from app.responses import compressor
+    compressor.init_app(app)
+    
     @login_manager.user_loader
     def load_user(user_id):
         return User.query.get(int(user_id))
@@ -120,12 +173,13 @@ def configure_logging(app):
 def register_template_utils(app):
     """注册模板工具函数和全局变量"""
     from app.utils import get_dict_label, format_datetime, has_permission
+    from app.sysconfig import get_config
     
     @app.context_processor
     def inject_global_vars():
         """注入全局变量"""
         return {
-            'system_name': app.config['SYSTEM_NAME'],
+            'system_name': get_config('sys.name', app.config['SYSTEM_NAME']),
             'system_version': app.config['SYSTEM_VERSION'],
             'copyright': app.config['COPYRIGHT'],
             'demo_enabled': app.config['DEMO_ENABLED']
@@ -0,0 +1,203 @@
+"""
+静态资源构建与发布 - 构建时为static下的文件生成带内容哈希的文件名(static/dist)、
+manifest.json和预压缩的.gz/.br文件；运行时url_for('static', filename=...)自动替换为哈希文件名，
+哈希文件按客户端Accept-Encoding发送预压缩版本，并设置一年的immutable缓存头
+用法:
+    python -m app.assets            # 构建到 app/static/dist
+    python -m app.assets --clean    # 删除旧的构建结果后重新构建
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+import posixpath
+import mimetypes
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只生成gzip
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# 压缩后明显变小的文本类资源
+COMPRESS_EXTENSIONS = ('.js', '.css', '.svg', '.json', '.txt', '.html', '.eot', '.ttf', '.otf', '.map')
+# 小于该字节数的文件不生成压缩版本
+COMPRESS_MIN_SIZE = 1024
+
+# 编码名 -> 预压缩文件后缀，按优先顺序
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# CSS中的url(...)引用
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def hashed_name(path, content, length=12):
+    """css/style.css -> css/style.<哈希>.css"""
+    digest = hashlib.sha256(content).hexdigest()[:length]
+    base, ext = posixpath.splitext(path)
+    return f'{base}.{digest}{ext}'
+
+
+def _rewrite_css(path, content, manifest):
+    """将CSS中相对路径引用替换为哈希文件名(保留?v=和#后缀)"""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, url = match.group(1), match.group(2)
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        logical = posixpath.normpath(posixpath.join(directory, target))
+        if logical not in manifest:
+            return match.group(0)
+        # 构建后的CSS位于dist下的同名目录
+        relative = posixpath.relpath(manifest[logical], posixpath.join(DIST_DIR, directory))
+        return f'url({quote}{relative}{suffix}{quote})'
+
+    return _CSS_URL.sub(replace, content.decode('utf-8', 'surrogateescape')).encode('utf-8', 'surrogateescape')
+
+
+def _write_compressed(path, content):
+    """生成预压缩文件，只保留确实变小的版本"""
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, data in variants:
+        if len(data) < len(content):
+            with open(path + suffix, 'wb') as f:
+                f.write(data)
+
+
+def build(static_folder, clean=False):
+    """
+    构建静态资源，CSS最后处理以便引用替换为已生成的哈希文件名
+    :return: manifest {原路径: 哈希路径}(均相对static目录，使用/分隔)
+    """
+    output = os.path.join(static_folder, DIST_DIR)
+    if clean and os.path.isdir(output):
+        shutil.rmtree(output)
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        if os.path.abspath(root) == os.path.abspath(static_folder) and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for name in files:
+            sources.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+    sources.sort(key=lambda p: (p.endswith('.css'), p))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            content = f.read()
+        if path.endswith('.css'):
+            content = _rewrite_css(path, content, manifest)
+        target = hashed_name(path, content)
+        manifest[path] = f'{DIST_DIR}/{target}'
+        destination = os.path.join(output, target)
+        if os.path.exists(destination):
+            continue
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, 'wb') as f:
+            f.write(content)
+        if path.endswith(COMPRESS_EXTENSIONS) and len(content) >= COMPRESS_MIN_SIZE:
+            _write_compressed(destination, content)
+
+    with open(os.path.join(output, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    return manifest
+
+
+def accepted_encodings(header):
+    """解析Accept-Encoding，返回q>0的编码集合"""
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class AssetManifest:
+    """静态资源清单: 替换url_for生成的静态文件地址，发送预压缩文件"""
+
+    def __init__(self):
+        self.manifest = {}
+        self.hashed = frozenset()
+        self.static_folder = None
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        if app.config.get('ASSETS_MANIFEST_ENABLED', True):
+            self.load(os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME))
+        if self.manifest:
+            app.url_defaults(self._url_defaults)
+        app.view_functions['static'] = self.send_static_file
+        app.jinja_env.globals['asset_url'] = self.url
+
+    def load(self, path):
+        """加载清单文件(未构建时保持原文件名)"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.hashed = frozenset(self.manifest.values())
+
+    def url(self, filename):
+        """原路径对应的发布路径(相对static目录)"""
+        return self.manifest.get(filename, filename)
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.url(values['filename'])
+
+    def send_static_file(self, filename):
+        """哈希文件: 优先发送客户端支持的预压缩版本并设置immutable缓存；其他文件按Flask默认处理"""
+        if filename not in self.hashed:
+            return current_app.send_static_file(filename)
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.isfile(os.path.join(self.static_folder, filename + suffix)):
+                response = send_from_directory(self.static_folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(self.static_folder, filename)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+assets = AssetManifest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='构建带内容哈希的静态资源')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='静态资源目录')
+    parser.add_argument('--clean', action='store_true', help='删除旧的构建结果')
+    options = parser.parse_args()
+    manifest = build(options.static, clean=options.clean)
+    print(f"已构建 {len(manifest)} 个文件到 {os.path.join(options.static, DIST_DIR)}"
+          f"{'' if brotli is not None else '(未安装brotli，只生成gzip)'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+审计日志异步写入 - 登录日志、在线用户等记录在内存队列中排队，
+由后台线程按数量/时间阈值批量写入，登录请求本身不再为日志提交事务
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+from collections import deque
+from sqlalchemy import insert, delete
+from app.models import db, OnlineUser
+
+# 事件类型
+EVENT_INSERT = 'insert'    # 插入一行: (model, row)
+EVENT_ONLINE = 'online'    # 记录在线用户: row
+EVENT_OFFLINE = 'offline'  # 删除在线用户: sessionId
+EVENT_OFFLINE_USER = 'offline_user'  # 删除账号的全部在线记录: login_name
+EVENT_CALL = 'call'        # 在写入线程中执行回调(批量写入完成后): func
+
+
+class AuditWriter:
+    """审计日志批量写入器"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.batch_size = 200
+        self.flush_interval = 1.0
+        self.put_timeout = 0.05
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._stats = {
+            'queued': 0,       # 累计入队事件数
+            'written': 0,      # 累计写入事件数
+            'dropped': 0,      # 队列已满被丢弃的事件数
+            'failed': 0,       # 写入失败的事件数
+            'batches': 0,      # 累计批次数
+            'max_depth': 0,    # 队列最大深度
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('AUDIT_ASYNC', True)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 1.0)
+        self.put_timeout = app.config.get('AUDIT_PUT_TIMEOUT', 0.05)
+        self._queue = queue.Queue(maxsize=app.config.get('AUDIT_QUEUE_SIZE', 10000))
+        app.extensions['audit_writer'] = self
+        atexit.register(self.stop)
+
+    # 入队接口
+
+    def add(self, model, **row):
+        """插入一条日志记录"""
+        self._submit((EVENT_INSERT, (model, row)))
+
+    def online(self, **row):
+        """记录在线用户(按sessionId)"""
+        self._submit((EVENT_ONLINE, row))
+
+    def offline(self, session_id):
+        """删除在线用户记录"""
+        self._submit((EVENT_OFFLINE, session_id))
+
+    def offline_user(self, login_name):
+        """删除账号的全部在线记录(之前排队的该账号在线记录也不再写入)"""
+        self._submit((EVENT_OFFLINE_USER, login_name))
+
+    def call(self, func):
+        """在写入线程中执行回调，func在应用上下文中调用"""
+        self._submit((EVENT_CALL, func))
+
+    def _submit(self, event):
+        if not self.enabled:
+            # 同步模式(测试或脚本): 立即写入
+            self._write_batch([event])
+            return
+        self._ensure_started()
+        try:
+            self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return
+        with self._lock:
+            self._stats['queued'] += 1
+            depth = self._queue.qsize()
+            if depth > self._stats['max_depth']:
+                self._stats['max_depth'] = depth
+
+    # 后台线程
+
+    def _ensure_started(self):
+        """延迟启动写入线程(多进程fork后在子进程中重新启动)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write_batch(batch)
+            elif self._stopping:
+                return
+
+    def _take_batch(self):
+        """取一批事件: 达到batch_size或等待超过flush_interval即返回"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or (self._stopping and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        """将一批事件合并为批量INSERT/DELETE后一次提交"""
+        start = time.perf_counter()
+        inserts = {}
+        online = {}  # sessionId -> row，None表示删除
+        offline_users = set()
+        callbacks = []
+        for kind, payload in batch:
+            if kind == EVENT_INSERT:
+                model, row = payload
+                inserts.setdefault(model, []).append(row)
+            elif kind == EVENT_ONLINE:
+                online[payload['sessionId']] = payload
+            elif kind == EVENT_OFFLINE:
+                online[payload] = None
+            elif kind == EVENT_OFFLINE_USER:
+                offline_users.add(payload)
+                for session_id, row in online.items():
+                    if row is not None and row['login_name'] == payload:
+                        online[session_id] = None
+            elif kind == EVENT_CALL:
+                callbacks.append(payload)
+
+        ok = True
+        with self.app.app_context():
+            try:
+                for model, rows in inserts.items():
+                    db.session.execute(insert(model), rows)
+                if offline_users:
+                    db.session.execute(
+                        delete(OnlineUser).where(OnlineUser.login_name.in_(list(offline_users)))
+                    )
+                if online:
+                    db.session.execute(
+                        delete(OnlineUser).where(OnlineUser.sessionId.in_(list(online)))
+                    )
+                    rows = [row for row in online.values() if row is not None]
+                    if rows:
+                        db.session.execute(insert(OnlineUser), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                ok = False
+                self.app.logger.exception('审计日志批量写入失败')
+            for func in callbacks:
+                try:
+                    func()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('审计回调执行失败')
+            db.session.remove()
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['written' if ok else 'failed'] += len(batch)
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    def flush(self, timeout=5.0):
+        """等待队列中已有事件写入完成"""
+        deadline = time.monotonic() + timeout
+        while self._queue is not None and not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # 最后一批可能已出队但尚未提交
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            done = threading.Event()
+            self._submit((EVENT_CALL, done.set))
+            done.wait(max(0.0, deadline - time.monotonic()))
+
+    def stop(self, timeout=5.0):
+        """停止写入线程，退出前写完队列中剩余事件"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        self._stopping = True
+        thread.join(timeout)
+
+    def stats(self):
+        """背压监控指标"""
+        with self._lock:
+            result = dict(self._stats)
+        result['depth'] = self._queue.qsize() if self._queue is not None else 0
+        result['capacity'] = self._queue.maxsize if self._queue is not None else 0
+        return result
+
+
+class LatencyStats:
+    """接口耗时统计(每个接口保留最近window次耗时用于计算分位数)"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._data = {}  # endpoint -> [count, total_ms, max_ms, deque]
+
+    def record(self, endpoint, elapsed_ms):
+        with self._lock:
+            item = self._data.get(endpoint)
+            if item is None:
+                item = self._data[endpoint] = [0, 0.0, 0.0, deque(maxlen=self.window)]
+            item[0] += 1
+            item[1] += elapsed_ms
+            item[2] = max(item[2], elapsed_ms)
+            item[3].append(elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            data = {key: (v[0], v[1], v[2], sorted(v[3])) for key, v in self._data.items()}
+        result = {}
+        for endpoint, (count, total, max_ms, samples) in data.items():
+            def percentile(p):
+                return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3)
+            result[endpoint] = {
+                'count': count,
+                'avg_ms': round(total / count, 3),
+                'max_ms': round(max_ms, 3),
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'p99_ms': percentile(0.99),
+            }
+        return result
+
+
+audit_writer = AuditWriter()
+latency_stats = LatencyStats()
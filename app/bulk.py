@@ -0,0 +1,60 @@
+"""
+批量修改 - 按ID列表执行集合UPDATE/DELETE，替代逐条查询修改；
+ID列表分批绑定，每条语句的参数个数不超过数据库限制(旧版SQLite为999)
+"""
+from flask import current_app, has_app_context
+from sqlalchemy import update, delete, insert
+from app.models import db
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def parse_ids(value):
+    """逗号分隔的ID字符串 -> 去重后的整数列表(保持顺序)，含非数字时抛出ValueError"""
+    ids = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if item:
+            ids[int(item)] = None
+    return list(ids)
+
+
+def chunked(values, size=None):
+    """按批拆分列表，默认批大小取配置BULK_CHUNK_SIZE"""
+    if size is None:
+        size = current_app.config.get('BULK_CHUNK_SIZE', DEFAULT_CHUNK_SIZE) if has_app_context() \
+            else DEFAULT_CHUNK_SIZE
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def bulk_update(column, ids, values, *criteria):
+    """
+    UPDATE table SET ... WHERE column IN (ids) [AND criteria]
+    :param column: 匹配ID的列，如 User.user_id
+    :param values: {字段名: 值}
+    :return: 影响行数
+    """
+    count = 0
+    for chunk in chunked(list(ids)):
+        statement = update(column.table).where(column.in_(chunk), *criteria).values(**values)
+        count += db.session.execute(statement).rowcount
+    return count
+
+
+def bulk_delete(column, ids, *criteria):
+    """
+    DELETE FROM table WHERE column IN (ids) [AND criteria]，也用于删除关联表记录，如 user_role.c.role_id
+    :return: 影响行数
+    """
+    count = 0
+    for chunk in chunked(list(ids)):
+        count += db.session.execute(delete(column.table).where(column.in_(chunk), *criteria)).rowcount
+    return count
+
+
+def insert_links(table, rows):
+    """批量写入关联表记录(executemany)，rows为字典列表，返回写入行数"""
+    if rows:
+        db.session.execute(insert(table), rows)
+    return len(rows)
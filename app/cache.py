@@ -0,0 +1,323 @@
+"""
+缓存 - 进程内LRU(带TTL) + 可选的共享缓存(Redis协议)两级缓存；
+数据表变更时通过发布/订阅通知其他进程递增本地数据版本号，保持各进程缓存一致
+"""
+import os
+import json
+import time
+import uuid
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+from app import versions
+from app.resp import RespClient, RespError
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# 共享缓存不可用时的异常
+_SHARED_ERRORS = (OSError, ConnectionError, RespError, pickle.PickleError, EOFError)
+
+
+class LRUCache:
+    """线程安全的LRU缓存，超过容量时淘汰最久未使用的条目，ttl(秒)为默认过期时间"""
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expire_at或None, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expire_at, value = item
+            if expire_at is not None and expire_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expire_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    两级缓存
+    - 本地: LRUCache，按数据表版本号校验
+    - 共享: 配置CACHE_REDIS_URL后启用，键中带有各数据表在共享缓存中的版本号
+    - 失效: 本进程提交事务后递增共享版本号并发布变更的表名，其他进程收到后递增本地版本号
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.local = LRUCache(1024, 300)
+        self.shared = None
+        self.prefix = 'dntest:'
+        self.channel = 'dntest:invalidate'
+        self.shared_ttl = 3600
+        self.retry_interval = 5.0
+        self._node = uuid.uuid4().hex
+        self._tables = set()  # 本进程缓存依赖过的表
+        self._remote = threading.local()
+        self._retry_at = 0.0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'errors': 0,
+            'published': 0,
+            'received': 0,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.local = LRUCache(app.config.get('CACHE_LOCAL_SIZE', 1024), app.config.get('CACHE_LOCAL_TTL', 300))
+        self.prefix = app.config.get('CACHE_KEY_PREFIX', 'dntest:')
+        self.channel = self.prefix + 'invalidate'
+        self.shared_ttl = app.config.get('CACHE_SHARED_TTL', 3600)
+        self.retry_interval = app.config.get('CACHE_RETRY_INTERVAL', 5.0)
+        url = app.config.get('CACHE_REDIS_URL')
+        self.shared = RespClient(url, app.config.get('CACHE_REDIS_TIMEOUT', 1.0)) if url else None
+        app.extensions['cache'] = self
+        versions.add_listener(self._on_tables_changed)
+        if self.shared is not None:
+            app.before_request(self._ensure_started)
+
+    # 读写接口
+
+    def get_or_load(self, key, loader, tables=(), ttl=None):
+        """
+        读取缓存，未命中时调用loader()加载并写入两级缓存
+        :param key: 缓存键(字符串)
+        :param loader: 加载函数，启用共享缓存时返回值需可pickle
+        :param tables: 数据依赖的表，任一表变更后缓存失效
+        :param ttl: 本地缓存过期秒数，默认CACHE_LOCAL_TTL
+        """
+        version = versions.table_version(*tables)
+        entry = self.local.get(key)
+        if entry is not None and entry[0] == version:
+            self._count('local_hits')
+            return entry[1]
+        if tables and not self._tables.issuperset(tables):
+            with self._lock:
+                self._tables.update(tables)
+
+        value = _MISSING
+        shared_key = None
+        if self._shared_available():
+            try:
+                shared_key = self._shared_key(key, tables)
+                raw = self.shared.get(shared_key)
+                if raw is not None:
+                    value = pickle.loads(raw)
+                    self._count('shared_hits')
+            except _SHARED_ERRORS:
+                self._shared_failed()
+                shared_key = None
+
+        if value is _MISSING:
+            self._count('misses')
+            value = loader()
+            if shared_key is not None:
+                try:
+                    self.shared.set(shared_key, pickle.dumps(value), px=self.shared_ttl * 1000)
+                except _SHARED_ERRORS:
+                    self._shared_failed()
+        self.local.set(key, (version, value), ttl)
+        return value
+
+    def get(self, key, default=None):
+        """读取不依赖数据表的缓存值"""
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count('local_hits')
+            return entry[1]
+        if self._shared_available():
+            try:
+                raw = self.shared.get(self.prefix + key)
+                if raw is not None:
+                    value = pickle.loads(raw)
+                    self._count('shared_hits')
+                    self.local.set(key, ((), value))
+                    return value
+            except _SHARED_ERRORS:
+                self._shared_failed()
+        self._count('misses')
+        return default
+
+    def set(self, key, value, ttl=None):
+        """写入不依赖数据表的缓存值"""
+        self.local.set(key, ((), value), ttl)
+        if self._shared_available():
+            try:
+                self.shared.set(self.prefix + key, pickle.dumps(value), px=(ttl or self.shared_ttl) * 1000)
+            except _SHARED_ERRORS:
+                self._shared_failed()
+
+    def delete(self, key):
+        """删除缓存值，并通知其他进程删除本地副本"""
+        self.local.delete(key)
+        if self._shared_available():
+            try:
+                self.shared.pipeline([
+                    ('DEL', self.prefix + key),
+                    ('PUBLISH', self.channel, self._message(keys=[key])),
+                ])
+                self._count('published')
+            except _SHARED_ERRORS:
+                self._shared_failed()
+
+    def generations(self, tables):
+        """共享缓存中各表的全局版本号(所有进程一致)，共享缓存不可用时返回None"""
+        if not tables or not self._shared_available():
+            return None
+        try:
+            gens = self.shared.mget(*(self.prefix + 'ver:' + table for table in tables))
+        except _SHARED_ERRORS:
+            self._shared_failed()
+            return None
+        return tuple((g or b'0').decode() for g in gens)
+
+    def clear(self):
+        """清空本进程的本地缓存"""
+        self.local.clear()
+
+    def stats(self):
+        """命中统计"""
+        with self._lock:
+            result = dict(self._stats)
+        lookups = result['local_hits'] + result['shared_hits'] + result['misses']
+        result['hit_rate'] = round((result['local_hits'] + result['shared_hits']) / lookups, 4) if lookups else 0.0
+        result['local_size'] = len(self.local)
+        result['shared'] = self.shared is not None
+        result['shared_available'] = self.shared is not None and time.monotonic() >= self._retry_at
+        return result
+
+    # 共享缓存
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _shared_available(self):
+        return self.shared is not None and time.monotonic() >= self._retry_at
+
+    def _shared_failed(self):
+        """共享缓存出错后一段时间内只使用本地缓存"""
+        self._count('errors')
+        if time.monotonic() >= self._retry_at:
+            logger.warning('共享缓存不可用，%s秒内只使用本地缓存', self.retry_interval)
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def _shared_key(self, key, tables):
+        """共享缓存键: 前缀 + 键 + 各依赖表的共享版本号"""
+        if not tables:
+            return self.prefix + key
+        gens = self.shared.mget(*(self.prefix + 'ver:' + table for table in tables))
+        return self.prefix + key + '@' + '.'.join((g or b'0').decode() for g in gens)
+
+    def _message(self, tables=(), keys=()):
+        return json.dumps({'node': self._node, 'tables': list(tables), 'keys': list(keys)})
+
+    def _on_tables_changed(self, tables):
+        """本进程提交事务后: 递增共享版本号并通知其他进程(收到的远程通知不再转发)"""
+        if getattr(self._remote, 'active', False) or not self._shared_available():
+            return
+        commands = [('INCR', self.prefix + 'ver:' + table) for table in tables]
+        commands.append(('PUBLISH', self.channel, self._message(tables=tables)))
+        try:
+            self.shared.pipeline(commands)
+            self._count('published')
+        except _SHARED_ERRORS:
+            self._shared_failed()
+
+    def _ensure_started(self):
+        """延迟启动订阅线程(多进程fork后在子进程中重新启动)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # 子进程使用新的节点ID，以便收到父进程其他子进程的通知
+                self._node = uuid.uuid4().hex
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        """订阅失效通知，断线后重连；断线期间可能漏掉通知，因此重新订阅后使全部缓存失效"""
+        reconnecting = False
+        while True:
+            try:
+                for message in self.shared.listen(self.channel):
+                    if message is None:
+                        if reconnecting:
+                            self._invalidate_all()
+                            reconnecting = False
+                        continue
+                    try:
+                        self._apply(message)
+                    except ValueError:
+                        logger.warning('无法解析的缓存失效通知: %r', message)
+            except _SHARED_ERRORS:
+                pass
+            reconnecting = True
+            time.sleep(self.retry_interval)
+
+    def _apply(self, message):
+        """应用其他进程发布的失效通知"""
+        data = json.loads(message)
+        if data.get('node') == self._node:
+            return
+        self._count('received')
+        for key in data.get('keys', ()):
+            self.local.delete(key)
+        tables = data.get('tables')
+        if tables:
+            self._remote.active = True
+            try:
+                versions.bump(*tables)
+            finally:
+                self._remote.active = False
+
+    def _invalidate_all(self):
+        self.local.clear()
+        tables = self._tables | set(versions.known_tables())
+        if tables:
+            self._remote.active = True
+            try:
+                versions.bump(*tables)
+            finally:
+                self._remote.active = False
+
+
+cache = TwoTierCache()
@@ -0,0 +1,101 @@
+"""
+数据库引擎配置 - SQLite连接参数(WAL、busy_timeout、缓存等PRAGMA)、连接池和只读库，
+所有设置来自配置，值为None的PRAGMA保持SQLite默认
+"""
+from sqlalchemy import event, pool
+from sqlalchemy.engine import make_url
+from app.models import db
+from app.replica import REPLICA_BIND, register_routing_listeners
+
+# PRAGMA名 -> 配置项
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'SQLITE_JOURNAL_MODE'),
+    ('synchronous', 'SQLITE_SYNCHRONOUS'),
+    ('busy_timeout', 'SQLITE_BUSY_TIMEOUT'),
+    ('cache_size', 'SQLITE_CACHE_SIZE'),
+    ('mmap_size', 'SQLITE_MMAP_SIZE'),
+    ('temp_store', 'SQLITE_TEMP_STORE'),
+)
+
+# 内存数据库不支持的PRAGMA
+_FILE_ONLY_PRAGMAS = ('journal_mode', 'mmap_size')
+
+POOL_CLASSES = {
+    'QueuePool': pool.QueuePool,
+    'NullPool': pool.NullPool,
+    'StaticPool': pool.StaticPool,
+    'SingletonThreadPool': pool.SingletonThreadPool,
+}
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory(uri):
+    return make_url(uri).database in (None, '', ':memory:')
+
+
+def sqlite_pragmas(config, uri):
+    """根据配置生成连接时执行的PRAGMA列表[(名称, 值)]"""
+    pragmas = []
+    for name, key in SQLITE_PRAGMAS:
+        value = config.get(key)
+        if value is None or (name in _FILE_ONLY_PRAGMAS and is_memory(uri)):
+            continue
+        pragmas.append((name, value))
+    return pragmas
+
+
+def engine_options(config, uri):
+    """SQLite文件数据库的连接池参数(内存数据库使用SQLAlchemy默认的单连接池)"""
+    options = {}
+    if not is_sqlite(uri) or is_memory(uri):
+        return options
+    pool_class = config.get('SQLITE_POOL_CLASS')
+    if pool_class:
+        options['poolclass'] = POOL_CLASSES[pool_class]
+    if pool_class in (None, 'QueuePool'):
+        options['pool_size'] = config.get('SQLITE_POOL_SIZE', 5)
+        options['max_overflow'] = config.get('SQLITE_MAX_OVERFLOW', 10)
+        options['pool_timeout'] = config.get('SQLITE_POOL_TIMEOUT', 30)
+    # 连接可能在不同线程间归还/复用
+    options['connect_args'] = {'check_same_thread': False}
+    return options
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    """每个新建连接执行PRAGMA"""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def init_database(app):
+    """初始化数据库: 合并连接池参数和只读库后初始化Flask-SQLAlchemy，再为SQLite引擎注册PRAGMA"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    options = engine_options(app.config, uri)
+    # 配置中显式给出的引擎参数优先
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = replica_uri
+        app.config['SQLALCHEMY_BINDS'] = binds
+    register_routing_listeners()
+    db.init_app(app)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                set_sqlite_pragmas(engine, sqlite_pragmas(app.config, str(engine.url)))
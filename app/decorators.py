@@ -1,9 +1,28 @@
 """
 权限装饰器
 """
+import json
+import time
+from datetime import datetime
 from functools import wraps
-from flask import abort, flash, redirect, url_for
+from flask import abort, flash, redirect, url_for, request, current_app
 from flask_login import current_user
+from app.audit import audit_writer, latency_stats
+from app.models import OperLog
+from app.utils import get_client_ip
+from app.replica import read_only  # noqa: F401 只读接口装饰器
+from app.responses import versioned  # noqa: F401 条件请求(ETag/304)装饰器
+
+# 操作日志业务类型
+BUSINESS_OTHER = 0
+BUSINESS_INSERT = 1
+BUSINESS_UPDATE = 2
+BUSINESS_DELETE = 3
+BUSINESS_IMPORT = 6  # 导入
+BUSINESS_FORCE = 7  # 强退
+
+# 操作日志中需要脱敏的参数
+SENSITIVE_PARAMS = {'password', 'oldPassword', 'newPassword', 'confirmPassword'}
 
 
 def login_required(f):
@@ -60,3 +79,68 @@ def check_demo_mode(f):
         
         return f(*args, **kwargs)
     return decorated_function
+
+
+def _truncate(text, limit):
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit] + '...'
+
+
+def oper_log(title, business_type=BUSINESS_OTHER):
+    """
+    记录操作日志(写入sys_oper_log，异步批量提交)，同时统计接口耗时
+    用法: @oper_log('用户管理', BUSINESS_INSERT)
+    """
+    def decorator(f):
+        method = f'{f.__module__}.{f.__name__}()'
+        
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            start = time.perf_counter()
+            status = 0
+            error_msg = None
+            response = None
+            try:
+                response = f(*args, **kwargs)
+                return response
+            except Exception as e:
+                status = 1
+                error_msg = str(e)
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                latency_stats.record(request.endpoint, elapsed_ms)
+                
+                limit = current_app.config.get('OPER_LOG_MAX_LENGTH', 2000)
+                params = {k: ('******' if k in SENSITIVE_PARAMS else v) for k, v in request.values.items()}
+                params.update(kwargs)
+                json_result = None
+                if response is not None and getattr(response, 'is_json', False):
+                    result = response.get_json(silent=True) or {}
+                    json_result = response.get_data(as_text=True)
+                    if result.get('code', 0) != 0:
+                        status = 1
+                        error_msg = result.get('msg')
+                
+                audit_writer.add(
+                    OperLog,
+                    title=title,
+                    business_type=business_type,
+                    method=method,
+                    request_method=request.method,
+                    operator_type=1,
+                    oper_name=current_user.login_name if current_user.is_authenticated else '',
+                    dept_name=current_user.dept.dept_name if current_user.is_authenticated and current_user.dept else '',
+                    oper_url=_truncate(request.path, 255),
+                    oper_ip=get_client_ip(),
+                    oper_location='',
+                    oper_param=_truncate(json.dumps(params, ensure_ascii=False, default=str), limit),
+                    json_result=_truncate(json_result, limit),
+                    status=status,
+                    error_msg=_truncate(error_msg, limit),
+                    oper_time=datetime.now(),
+                    cost_time=int(elapsed_ms)
+                )
+        return decorated_function
+    return decorator
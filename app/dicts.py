@@ -0,0 +1,76 @@
+"""
+字典缓存 - 按字典类型一次加载到内存，标签翻译为字典查找
+"""
+from collections import namedtuple
+from app.models import DictData
+from app.cache import cache
+from app import versions
+
+DICT_TABLES = ('sys_dict_data', 'sys_dict_type')
+
+DictItem = namedtuple('DictItem', [
+    'dict_code', 'dict_sort', 'dict_label', 'dict_value', 'dict_type',
+    'css_class', 'list_class', 'is_default'
+])
+
+# 某一字典类型的缓存条目: items为有序字典项列表, labels为 值->标签 映射
+DictEntry = namedtuple('DictEntry', ['items', 'labels'])
+
+
+def load_dict(dict_type):
+    """一次查询加载指定字典类型的所有正常状态字典项"""
+    rows = DictData.query.filter_by(
+        dict_type=dict_type,
+        status='0'
+    ).order_by(DictData.dict_sort).all()
+    items = tuple(DictItem(
+        row.dict_code, row.dict_sort, row.dict_label, row.dict_value, row.dict_type,
+        row.css_class, row.list_class, row.is_default
+    ) for row in rows)
+    labels = {}
+    for item in items:
+        # 与原先first()语义一致，同值取排序靠前的标签
+        labels.setdefault(item.dict_value, item.dict_label)
+    return DictEntry(items, labels)
+
+
+def get_dict(dict_type):
+    """获取字典缓存条目(字典数据变更后自动重新加载)"""
+    return cache.get_or_load('dict:' + dict_type, lambda: load_dict(dict_type), DICT_TABLES)
+
+
+def get_label(dict_type, dict_value):
+    """根据字典类型和值获取标签，找不到时返回原值"""
+    if not dict_value:
+        return ''
+    return get_dict(dict_type).labels.get(str(dict_value), dict_value)
+
+
+def get_labels(dict_type, values):
+    """批量获取标签，返回与values顺序对应的标签列表"""
+    labels = get_dict(dict_type).labels
+    return [labels.get(str(value), value) if value else '' for value in values]
+
+
+def label_rows(rows, fields, suffix='_label'):
+    """
+    为列表数据批量添加字典标签
+    :param rows: 字典行列表
+    :param fields: {字段名: 字典类型}
+    :param suffix: 标签字段后缀，如 sex -> sex_label
+    """
+    for field, dict_type in fields.items():
+        labels = get_dict(dict_type).labels
+        key = field + suffix
+        for row in rows:
+            value = row.get(field)
+            row[key] = labels.get(str(value), value) if value else ''
+    return rows
+
+
+def invalidate_dict(dict_type=None):
+    """清除字典缓存，dict_type为None时清除全部"""
+    if dict_type is None:
+        versions.bump(*DICT_TABLES)
+    else:
+        cache.delete('dict:' + dict_type)
@@ -0,0 +1,293 @@
+"""
+数据导入导出 - 导出时查询结果以yield_per分批读取，边读边写入CSV或XLSX并以分块响应发送，
+内存占用与导出行数无关，首批数据读取后即开始发送；导入时逐行读取CSV或XLSX
+"""
+import io
+import re
+import csv
+import posixpath
+import zipfile
+from datetime import datetime
+from urllib.parse import quote
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+from flask import Response, stream_with_context, current_app
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# Excel单个工作表最多1048576行(含表头)，超出部分截断，大数据量请导出CSV
+XLSX_MAX_ROWS = 1048575
+
+# CSV中以这些字符开头的文本会被电子表格当作公式(含OWASP列出的制表符和回车)
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# XML 1.0不允许的控制字符
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_CELL_REF = re.compile(r'([A-Z]+)')
+_INTEGRAL_FLOAT = re.compile(r'^-?\d+\.0+$|^-?\d+(\.\d+)?[eE]\+?\d+$')
+
+
+def iter_rows(query, batch_size=None):
+    """按批读取查询结果(yield_per)，已读取的批次不在内存中保留"""
+    batch_size = batch_size or current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    return query.yield_per(batch_size)
+
+
+def format_value(value):
+    """导出单元格的值: 时间格式化，None为空"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+class _ChunkBuffer:
+    """收集写入的数据，由生成器取出后发送"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def csv_chunks(headers, rows, chunk_rows=1000):
+    """CSV分块生成器(UTF-8 BOM，Excel可直接打开)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    # 表头立即发送
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(format_value(value)) for value in row])
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _csv_value(value):
+    """防止CSV注入: 以公式字符开头的文本前加单引号"""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number, values, columns):
+    cells = []
+    for column, value in zip(columns, values):
+        value = format_value(value)
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            cells.append(f'<c r="{column}{number}"><v>{value}</v></c>')
+        elif value != '':
+            text = escape(_INVALID_XML_CHARS.sub('', str(value)))
+            cells.append(f'<c r="{column}{number}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def xlsx_chunks(headers, rows, sheet_name='Sheet1', chunk_rows=1000):
+    """XLSX分块生成器: 工作表以内联字符串逐行写入zip流，超过Excel行数上限的部分截断"""
+    buffer = _ChunkBuffer()
+    columns = [_column_letter(i) for i in range(len(headers))]
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name[:31], {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield buffer.take()
+        # 流式写入时大小未知，超过2GiB需ZIP64，须在开始写入前声明
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            lines = [_SHEET_HEAD, _xlsx_row(1, headers, columns)]
+            for number, row in enumerate(rows, start=2):
+                if number > XLSX_MAX_ROWS + 1:
+                    current_app.logger.warning('导出XLSX超过%s行，其余数据已截断', XLSX_MAX_ROWS)
+                    break
+                lines.append(_xlsx_row(number, row, columns))
+                if len(lines) >= chunk_rows:
+                    sheet.write(''.join(lines).encode('utf-8'))
+                    lines = []
+                    yield buffer.take()
+            lines.append(_SHEET_TAIL)
+            sheet.write(''.join(lines).encode('utf-8'))
+    yield buffer.take()
+
+
+def export_response(filename, headers, rows, fmt='xlsx'):
+    """
+    流式导出响应
+    :param filename: 文件名(不含扩展名)
+    :param headers: 表头列表
+    :param rows: 行迭代器(每行为与表头对应的值序列)
+    :param fmt: csv 或 xlsx
+    """
+    chunk_rows = current_app.config.get('EXPORT_CHUNK_ROWS', 1000)
+    if fmt == 'csv':
+        body = csv_chunks(headers, rows, chunk_rows)
+        mimetype = 'text/csv'
+    else:
+        fmt = 'xlsx'
+        body = xlsx_chunks(headers, rows, filename, chunk_rows)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    name = f'{filename}_{datetime.now().strftime("%Y%m%d%H%M%S")}.{fmt}'
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+    # 禁止反向代理缓冲，数据生成后立即发送
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def read_rows(fileobj, filename):
+    """按扩展名逐行读取CSV或XLSX，返回行迭代器(每行为字符串列表，首行为表头)"""
+    if filename.lower().endswith('.xlsx'):
+        return read_xlsx(fileobj)
+    return read_csv(fileobj)
+
+
+def read_csv(fileobj):
+    """逐行读取CSV(UTF-8，可带BOM)"""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    for row in csv.reader(text):
+        yield [value.strip() for value in row]
+
+
+def _column_index(ref, default):
+    match = _CELL_REF.match(ref or '')
+    if not match:
+        return default
+    index = 0
+    for letter in match.group(1):
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _first_sheet(archive):
+    """工作簿中第一个工作表的路径"""
+    try:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        sheet_id = workbook.find(f'{_NS_MAIN}sheets/{_NS_MAIN}sheet').get(f'{_NS_REL}id')
+        for rel in rels.iter(f'{_NS_PKG_REL}Relationship'):
+            if rel.get('Id') == sheet_id:
+                target = rel.get('Target')
+                return target.lstrip('/') if target.startswith('/') else posixpath.normpath('xl/' + target)
+    except (KeyError, AttributeError, ElementTree.ParseError):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _shared_strings(archive):
+    try:
+        data = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    strings = []
+    with data:
+        for _, elem in ElementTree.iterparse(data):
+            if elem.tag == f'{_NS_MAIN}si':
+                # 纯文本为<t>，富文本由多个<r><t>组成，忽略注音<rPh>
+                strings.append(''.join(child.text or '' if child.tag == f'{_NS_MAIN}t'
+                                       else child.findtext(f'{_NS_MAIN}t') or ''
+                                       for child in elem if child.tag in (f'{_NS_MAIN}t', f'{_NS_MAIN}r')))
+                elem.clear()
+    return strings
+
+
+def _cell_value(cell, shared):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(cell.find(f'{_NS_MAIN}is').itertext())
+    value = cell.findtext(f'{_NS_MAIN}v') or ''
+    if kind == 's':
+        return shared[int(value)] if value else ''
+    if kind in (None, 'n') and _INTEGRAL_FLOAT.match(value):
+        # 数字格式的手机号等: 13800000000.0 / 1.38E+10 转为整数文本
+        number = float(value)
+        if number.is_integer():
+            return str(int(number))
+    return value
+
+
+def read_xlsx(fileobj):
+    """逐行读取XLSX第一个工作表(已读取的行及时释放)"""
+    with zipfile.ZipFile(fileobj) as archive:
+        shared = _shared_strings(archive)
+        with archive.open(_first_sheet(archive)) as sheet:
+            for _, elem in ElementTree.iterparse(sheet):
+                if elem.tag != f'{_NS_MAIN}row':
+                    continue
+                values = {}
+                for position, cell in enumerate(elem.iter(f'{_NS_MAIN}c')):
+                    values[_column_index(cell.get('r'), position)] = _cell_value(cell, shared).strip()
+                elem.clear()
+                yield [values.get(i, '') for i in range(max(values) + 1)] if values else []
@@ -0,0 +1,194 @@
+"""
+索引检查工具 - 依次请求各列表接口，记录每个接口执行的SELECT语句，
+用EXPLAIN QUERY PLAN检查执行计划，报告全表扫描和临时排序；
+发现全表扫描时以非0状态退出，可在CI中防止索引回退
+用法:
+    python -m app.index_advisor              # 临时数据库 + 初始数据
+    python -m app.index_advisor --rows 5000  # 日志等大表额外填充数据
+    python -m app.index_advisor --database sqlite:///database/dntest.db --apply  # 为已有数据库补建缺失的表、列和索引
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from flask import has_request_context, request
+from sqlalchemy import event, insert
+
+# 检查的接口: (路径, 查询参数)
+ENDPOINTS = (
+    ('/index', {}),
+    ('/system/user/list/data', {}),
+    ('/system/user/list/data', {'status': '0'}),
+    ('/system/user/list/data', {'deptId': 100}),
+    ('/system/user/list/data', {'loginName': 'adm', 'phonenumber': '888'}),
+    ('/system/role/list/data', {}),
+    ('/system/role/list/data', {'roleName': '管理员', 'roleKey': 'admin'}),
+    ('/system/post/list/data', {}),
+    ('/system/post/list/data', {'postName': '董事长'}),
+    ('/system/config/list/data', {}),
+    ('/system/dept/tree', {}),
+    ('/system/menu/tree', {}),
+    ('/monitor/online/list/data', {}),
+    ('/monitor/job/list/data', {}),
+    ('/monitor/jobLog/list/data', {}),
+    ('/monitor/jobLog/list/data', {'jobName': 'demo', 'cursor': ''}),
+    ('/monitor/operlog/list/data', {}),
+    ('/monitor/operlog/list/data', {'cursor': ''}),
+    ('/monitor/logininfor/list/data', {}),
+    ('/monitor/logininfor/list/data', {'cursor': ''}),
+)
+
+# 数据量固定且很小的表，全表扫描不报告
+SMALL_TABLES = ('sys_post', 'sys_config', 'sys_job', 'sys_job_stats', 'sys_dict_type', 'sys_notice')
+
+_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+_TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+
+
+def capture_queries(app, client, endpoints=ENDPOINTS):
+    """请求接口并记录各接口执行的SELECT语句: {请求路径(含参数): [(sql, params)]}"""
+    from app.models import db
+    captured = {}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and statement.lstrip().upper().startswith('SELECT'):
+            captured.setdefault(request.full_path.rstrip('?'), []).append((statement, parameters))
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        for path, params in endpoints:
+            response = client.get(path, query_string=params)
+            if response.status_code != 200:
+                print(f'警告: {path} 返回 {response.status_code}', file=sys.stderr)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def explain(app, statement, parameters):
+    """返回执行计划的detail列表"""
+    from app.models import db
+    with app.app_context():
+        with db.engine.connect() as conn:
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def analyze(app, captured, ignore=SMALL_TABLES):
+    """
+    检查执行计划
+    :return: [(接口, sql, 问题类型, 计划行)]，问题类型为 full_scan 或 temp_sort
+    """
+    from app.models import db
+    tables = set(db.metadata.tables)
+    findings = []
+    for endpoint, queries in captured.items():
+        seen = set()
+        for statement, parameters in queries:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            for detail in explain(app, statement, parameters):
+                match = _SCAN.match(detail)
+                if match and match.group(1) in tables and match.group(1) not in ignore:
+                    findings.append((endpoint, statement, 'full_scan', detail))
+                elif _TEMP_SORT.search(detail):
+                    findings.append((endpoint, statement, 'temp_sort', detail))
+    return findings
+
+
+def create_missing_indexes(app):
+    """为已有数据库补建模型中声明但尚未创建的表、列和索引(见app.migrate)"""
+    from app.migrate import upgrade_database
+    return upgrade_database(app)
+
+
+def seed_rows(app, count):
+    """为日志类大表填充数据，使执行计划接近生产规模"""
+    from app.models import db, OperLog, LoginInfo, JobLog
+    now = datetime.now()
+    with app.app_context():
+        db.session.execute(insert(OperLog), [
+            {'title': '用户管理', 'business_type': i % 4, 'oper_name': 'admin', 'status': 0,
+             'oper_time': now - timedelta(seconds=i)} for i in range(count)])
+        db.session.execute(insert(LoginInfo), [
+            {'login_name': 'admin', 'status': '0', 'msg': '登录成功',
+             'login_time': now - timedelta(seconds=i)} for i in range(count)])
+        db.session.execute(insert(JobLog), [
+            {'job_name': 'demo', 'job_group': 'DEFAULT', 'invoke_target': 'app.tasks.no_params()',
+             'status': '0', 'create_time': now - timedelta(seconds=i)} for i in range(count)])
+        db.session.commit()
+
+
+def build_app(database=None):
+    """创建检查用的应用(不指定数据库时使用临时数据库并写入初始数据)"""
+    import config as app_config
+    tmp = tempfile.mkdtemp()
+
+    class AdvisorConfig(app_config.Config):
+        SQLALCHEMY_DATABASE_URI = database or 'sqlite:///' + os.path.join(tmp, 'db', 'advisor.db')
+        LOG_FOLDER = os.path.join(tmp, 'logs')
+        UPLOAD_FOLDER = os.path.join(tmp, 'uploads')
+        CAPTCHA_ENABLED = False
+        AUDIT_ASYNC = False
+        METRICS_STORE_ENABLED = False
+        SCHEDULER_ENABLED = False
+
+    app_config.config['advisor'] = AdvisorConfig
+    from app import create_app
+    from app.models import db
+    app = create_app('advisor')
+    if database is None:
+        import init_db
+        with app.app_context():
+            db.create_all()
+            init_db.insert_initial_data()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='列表接口执行计划检查')
+    parser.add_argument('--database', help='数据库地址，默认使用临时数据库')
+    parser.add_argument('--rows', type=int, default=2000, help='日志类表填充的行数(仅临时数据库)')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--apply', action='store_true', help='补建缺失的表、列和索引后再检查')
+    parser.add_argument('--show-sql', action='store_true', help='输出有问题的SQL')
+    options = parser.parse_args()
+
+    app = build_app(options.database)
+    if options.apply:
+        for change in create_missing_indexes(app):
+            print(change)
+    if options.database is None and options.rows:
+        seed_rows(app, options.rows)
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': options.username, 'password': options.password})
+    if response.get_json().get('code') != 0:
+        print('登录失败: ' + response.get_json().get('msg', ''), file=sys.stderr)
+        return 2
+
+    captured = capture_queries(app, client)
+    findings = analyze(app, captured)
+    for endpoint in captured:
+        problems = [f for f in findings if f[0] == endpoint]
+        print(f"{'!!' if any(f[2] == 'full_scan' for f in problems) else 'ok'} {endpoint} "
+              f'({len(captured[endpoint])}条查询)')
+        for _, statement, kind, detail in problems:
+            print(f"    {'全表扫描' if kind == 'full_scan' else '临时排序'}: {detail}")
+            if options.show_sql:
+                print('        ' + ' '.join(statement.split())[:300])
+    full_scans = sum(1 for f in findings if f[2] == 'full_scan')
+    print(f'共 {full_scans} 处全表扫描，{len(findings) - full_scans} 处临时排序')
+    return 1 if full_scans else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+定时任务租约 - 多个Gunicorn工作进程各自运行调度器时，
+通过数据库中的租约行保证同一任务的同一触发时间只由一个进程执行；
+执行中的租约定期心跳，进程异常退出后由其他进程接管超时租约
+"""
+import os
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update, delete, select
+from sqlalchemy.exc import IntegrityError
+from app.models import db, JobLease
+
+logger = logging.getLogger(__name__)
+
+LEASE_RUNNING = '0'
+LEASE_DONE = '1'
+
+
+class LeaseManager:
+    """任务租约管理"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = True
+        self.timeout = 30
+        self.heartbeat = 10
+        self.retention = 86400
+        self.owner = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._on_takeover = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SCHEDULER_LEASE_ENABLED', True)
+        self.timeout = app.config.get('SCHEDULER_LEASE_TIMEOUT', 30)
+        self.heartbeat = app.config.get('SCHEDULER_LEASE_HEARTBEAT', 10)
+        self.retention = app.config.get('SCHEDULER_LEASE_RETENTION', 86400)
+        app.extensions['job_lease'] = self
+
+    def start(self, on_takeover):
+        """
+        启动心跳线程
+        :param on_takeover: 接管超时租约后的回调 on_takeover(job_id, fire_time)
+        """
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._on_takeover = on_takeover
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='job-lease', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def claim(self, job_id, fire_time, exclusive=False):
+        """
+        认领一次触发，插入租约成功即获得执行权
+        :param exclusive: 禁止并发的任务，其他进程仍在执行该任务时放弃本次触发
+        """
+        if not self.enabled:
+            return True
+        now = datetime.now()
+        with self.app.app_context():
+            try:
+                status = LEASE_RUNNING
+                if exclusive:
+                    busy = db.session.execute(select(JobLease.lease_id).where(
+                        JobLease.job_id == job_id, JobLease.status == LEASE_RUNNING,
+                        JobLease.heartbeat_time >= now - timedelta(seconds=self.timeout)
+                    ).limit(1)).first()
+                    if busy:
+                        # 仍写入租约(标记为已完成)，其他进程不会再执行本次触发
+                        status = LEASE_DONE
+                db.session.execute(insert(JobLease).values(
+                    job_id=job_id, fire_time=fire_time, owner=self.owner,
+                    status=status, heartbeat_time=now, create_time=now
+                ))
+                db.session.commit()
+                return status == LEASE_RUNNING
+            except IntegrityError:
+                db.session.rollback()
+                return False
+            finally:
+                db.session.remove()
+
+    def complete(self, job_id, fire_time):
+        """执行完成，释放租约"""
+        if not self.enabled:
+            return
+        with self.app.app_context():
+            db.session.execute(update(JobLease).where(
+                JobLease.job_id == job_id, JobLease.fire_time == fire_time, JobLease.owner == self.owner
+            ).values(status=LEASE_DONE, heartbeat_time=datetime.now()))
+            db.session.commit()
+            db.session.remove()
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat):
+            try:
+                with self.app.app_context():
+                    self._beat()
+                    taken = self._take_over_stale()
+                    self._cleanup()
+                    db.session.remove()
+            except Exception:
+                logger.exception('任务租约维护失败')
+                continue
+            for job_id, fire_time in taken:
+                self._on_takeover(job_id, fire_time)
+
+    def _beat(self):
+        """一条语句刷新本进程所有执行中租约的心跳"""
+        db.session.execute(update(JobLease).where(
+            JobLease.owner == self.owner, JobLease.status == LEASE_RUNNING
+        ).values(heartbeat_time=datetime.now()))
+        db.session.commit()
+
+    def _take_over_stale(self):
+        """接管心跳超时的租约(按原心跳时间做比较并交换，只有一个进程能接管成功)"""
+        deadline = datetime.now() - timedelta(seconds=self.timeout)
+        stale = db.session.execute(select(
+            JobLease.lease_id, JobLease.job_id, JobLease.fire_time, JobLease.heartbeat_time
+        ).where(
+            JobLease.status == LEASE_RUNNING, JobLease.heartbeat_time < deadline
+        ).limit(100)).all()
+        taken = []
+        for lease_id, job_id, fire_time, heartbeat_time in stale:
+            result = db.session.execute(update(JobLease).where(
+                JobLease.lease_id == lease_id, JobLease.heartbeat_time == heartbeat_time,
+                JobLease.status == LEASE_RUNNING
+            ).values(owner=self.owner, heartbeat_time=datetime.now()))
+            db.session.commit()
+            if result.rowcount == 1:
+                logger.warning('接管超时任务租约: job_id=%s fire_time=%s', job_id, fire_time)
+                taken.append((job_id, fire_time))
+        return taken
+
+    def _cleanup(self):
+        """删除超过保留期限的已完成租约"""
+        db.session.execute(delete(JobLease).where(
+            JobLease.status == LEASE_DONE,
+            JobLease.heartbeat_time < datetime.now() - timedelta(seconds=self.retention)
+        ))
+        db.session.commit()
+
+
+lease_manager = LeaseManager()
@@ -0,0 +1,89 @@
+"""
+定时任务执行统计 - 每次执行后增量更新sys_job_stats，
+耗时分位数由固定分桶直方图估算，仪表盘读取时不扫描sys_job_log
+"""
+import json
+from bisect import bisect_left
+from sqlalchemy import select, insert, update, func, case
+from sqlalchemy.dialects import sqlite, postgresql, mysql
+from sqlalchemy.exc import IntegrityError
+from app.models import db, JobStats
+
+# 直方图分桶上界(毫秒)，最后一个桶为超过最大上界的耗时
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000, 300000, 600000)
+
+
+def percentile(histogram, p):
+    """由直方图估算分位数(取所在桶的上界)"""
+    total = sum(histogram)
+    if not total:
+        return 0
+    rank = total * p
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            return BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+    return BUCKETS[-1]
+
+
+def _accumulate(table, job_id, values, increments):
+    """
+    插入统计行，已存在时原子累加:
+    SQLite/PostgreSQL用 ON CONFLICT DO UPDATE，MySQL用 ON DUPLICATE KEY UPDATE，
+    其他数据库先UPDATE，不存在时INSERT，并发插入冲突时改为UPDATE
+    """
+    name = db.engine.dialect.name
+    if name in ('sqlite', 'postgresql'):
+        dialect = sqlite if name == 'sqlite' else postgresql
+        statement = dialect.insert(table).values(job_id=job_id, **values)
+        db.session.execute(statement.on_conflict_do_update(index_elements=[table.c.job_id], set_=increments))
+        return
+    if name in ('mysql', 'mariadb'):
+        statement = mysql.insert(table).values(job_id=job_id, **values)
+        db.session.execute(statement.on_duplicate_key_update(**increments))
+        return
+    accumulate = update(table).where(table.c.job_id == job_id).values(**increments)
+    if db.session.execute(accumulate).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(job_id=job_id, **values))
+    except IntegrityError:
+        # 其他进程已插入该任务的统计行
+        db.session.execute(accumulate)
+
+
+def update_job_stats(job_id, duration, status, run_time):
+    """
+    记录一次执行结果(在审计写入线程中调用)
+    计数用一条原子累加语句更新，多个进程同时执行同一任务时不丢失；
+    该语句取得写锁后，在同一事务中更新直方图和分位数
+    :param duration: 耗时(毫秒)
+    :param status: 0正常 1失败
+    """
+    table = JobStats.__table__
+    failed = 0 if status == '0' else 1
+    last = {'last_run_time': run_time, 'last_status': status, 'last_duration': duration}
+    max_time = func.coalesce(table.c.max_time, 0)
+    _accumulate(
+        table, job_id,
+        dict(run_count=1, fail_count=failed, total_time=duration, max_time=duration, **last),
+        dict(
+            run_count=func.coalesce(table.c.run_count, 0) + 1,
+            fail_count=func.coalesce(table.c.fail_count, 0) + failed,
+            total_time=func.coalesce(table.c.total_time, 0) + duration,
+            max_time=case((max_time < duration, duration), else_=max_time),
+            **last
+        ),
+    )
+
+    raw = db.session.execute(select(table.c.histogram).where(table.c.job_id == job_id)).scalar()
+    histogram = json.loads(raw) if raw else [0] * (len(BUCKETS) + 1)
+    histogram[bisect_left(BUCKETS, duration)] += 1
+    db.session.execute(update(table).where(table.c.job_id == job_id).values(
+        histogram=json.dumps(histogram),
+        p50_time=percentile(histogram, 0.50),
+        p95_time=percentile(histogram, 0.95),
+    ))
+    db.session.commit()
@@ -0,0 +1,154 @@
+"""
+服务器指标采样 - 后台线程按固定间隔采集CPU、内存、磁盘、网络和进程信息，
+保存在环形缓冲区中，监控接口直接读取最新快照，不在请求中阻塞采样
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+import psutil
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+
+class ServerSampler:
+    """服务器指标采样器"""
+
+    def __init__(self, app=None):
+        self.interval = 5.0
+        self.disk_path = '/'
+        self._buffer = deque(maxlen=720)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._process = None
+        self._last_net = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.interval = app.config.get('SERVER_SAMPLE_INTERVAL', 5.0)
+        self.disk_path = app.config.get('SERVER_SAMPLE_DISK_PATH', '/')
+        self._buffer = deque(maxlen=app.config.get('SERVER_SAMPLE_HISTORY', 720))
+        app.extensions['server_sampler'] = self
+
+    def add_listener(self, func):
+        """注册采样回调，每次采样后以快照字典调用(在采样线程中执行)"""
+        self._listeners.append(func)
+
+    def start(self):
+        """启动采样线程(启用指标历史时由run.py在启动时调用，保证未打开监控页面时也持续记录)"""
+        self._ensure_started()
+
+    def _ensure_started(self):
+        """延迟启动采样线程(多进程fork后在子进程中重新启动)"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._process = psutil.Process(self._pid)
+            self._last_net = None
+            self._stop.clear()
+            # 首次调用建立CPU统计基线，之后cpu_percent(interval=None)不再阻塞
+            psutil.cpu_percent(interval=None)
+            self._process.cpu_percent(interval=None)
+            self._thread = threading.Thread(target=self._run, name='server-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        """采集一次指标并写入环形缓冲区"""
+        now = time.time()
+        mem = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        net = psutil.net_io_counters()
+
+        sent_rate = recv_rate = 0.0
+        if self._last_net is not None:
+            last_time, last_net = self._last_net
+            elapsed = max(now - last_time, 1e-6)
+            sent_rate = (net.bytes_sent - last_net.bytes_sent) / elapsed / 1024
+            recv_rate = (net.bytes_recv - last_net.bytes_recv) / elapsed / 1024
+        self._last_net = (now, net)
+
+        process = self._process or psutil.Process(os.getpid())
+        with process.oneshot():
+            rss = process.memory_info().rss
+            process_cpu = process.cpu_percent(interval=None)
+            threads = process.num_threads()
+
+        snapshot = {
+            'timestamp': now,
+            'time': datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S'),
+            'cpu': {
+                'count': psutil.cpu_count(logical=False),
+                'count_logical': psutil.cpu_count(logical=True),
+                'percent': psutil.cpu_percent(interval=None)
+            },
+            'memory': {
+                'total': round(mem.total / GB, 2),
+                'used': round(mem.used / GB, 2),
+                'free': round(mem.free / GB, 2),
+                'percent': mem.percent
+            },
+            'disk': {
+                'total': round(disk.total / GB, 2),
+                'used': round(disk.used / GB, 2),
+                'free': round(disk.free / GB, 2),
+                'percent': disk.percent
+            },
+            'network': {
+                'bytes_sent': net.bytes_sent,
+                'bytes_recv': net.bytes_recv,
+                'sent_rate': round(sent_rate, 2),  # KB/s
+                'recv_rate': round(recv_rate, 2)   # KB/s
+            },
+            'process': {
+                'pid': process.pid,
+                'rss': round(rss / MB, 2),  # MB
+                'cpu_percent': process_cpu,
+                'threads': threads
+            }
+        }
+        self._buffer.append(snapshot)
+        for func in self._listeners:
+            try:
+                func(snapshot)
+            except Exception:
+                logger.exception('采样回调执行失败')
+        return snapshot
+
+    def latest(self):
+        """最新快照(采样线程未启动时先启动并同步采样一次)"""
+        self._ensure_started()
+        try:
+            return self._buffer[-1]
+        except IndexError:
+            return self.sample()
+
+    def series(self, since=None):
+        """缓冲区中的历史快照，since为时间戳时只返回之后的数据"""
+        self._ensure_started()
+        snapshots = list(self._buffer)
+        if since is not None:
+            snapshots = [s for s in snapshots if s['timestamp'] > since]
+        return snapshots
+
+    def stop(self):
+        self._stop.set()
+
+
+server_sampler = ServerSampler()
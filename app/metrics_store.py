@@ -0,0 +1,189 @@
+"""
+服务器指标历史存储 - 独立的SQLite文件，按 原始数据 -> 1分钟 -> 1小时 三级自动降采样，
+每级有各自的保留期限，范围查询按时间跨度选择合适的级别，长时间范围不扫描原始数据
+"""
+import os
+import time
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 指标名 -> 从采样快照中取值
+FIELDS = (
+    ('cpu', lambda s: s['cpu']['percent']),
+    ('mem', lambda s: s['memory']['percent']),
+    ('disk', lambda s: s['disk']['percent']),
+    ('net_sent', lambda s: s['network']['sent_rate']),
+    ('net_recv', lambda s: s['network']['recv_rate']),
+    ('proc_rss', lambda s: s['process']['rss']),
+    ('proc_cpu', lambda s: s['process']['cpu_percent']),
+)
+FIELD_NAMES = [name for name, _ in FIELDS]
+
+# 级别: (表名, 桶宽度秒数)
+TIER_RAW = ('metrics_raw', 1)
+TIER_MINUTE = ('metrics_1m', 60)
+TIER_HOUR = ('metrics_1h', 3600)
+TIERS = {'raw': TIER_RAW, '1m': TIER_MINUTE, '1h': TIER_HOUR}
+
+
+class MetricsStore:
+    """指标时序存储"""
+
+    def __init__(self, app=None):
+        self.path = None
+        self.enabled = False
+        self.interval = 5.0
+        self.retention = {}
+        self._local = threading.local()
+        self._lock_file = None
+        self._writer_pid = None
+        self._last_minute = None
+        self._last_hour = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_STORE_ENABLED', True)
+        self.path = app.config.get('METRICS_DB_PATH')
+        # 原始数据的采样间隔，用于按跨度估算各级别的点数
+        self.interval = app.config.get('SERVER_SAMPLE_INTERVAL', 5.0)
+        self.retention = {
+            TIER_RAW[0]: app.config.get('METRICS_RETENTION_RAW', 86400),
+            TIER_MINUTE[0]: app.config.get('METRICS_RETENTION_MINUTE', 7 * 86400),
+            TIER_HOUR[0]: app.config.get('METRICS_RETENTION_HOUR', 365 * 86400),
+        }
+        app.extensions['metrics_store'] = self
+        if self.enabled:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._create_tables()
+
+    def _connect(self):
+        """每个线程使用独立连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create_tables(self):
+        conn = self._connect()
+        raw_columns = ', '.join(f'{name} REAL' for name in FIELD_NAMES)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {TIER_RAW[0]} '
+                     f'(ts INTEGER PRIMARY KEY, {raw_columns})')
+        rollup_columns = ', '.join(f'{name}_avg REAL, {name}_max REAL' for name in FIELD_NAMES)
+        for table, _ in (TIER_MINUTE, TIER_HOUR):
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                         f'(ts INTEGER PRIMARY KEY, samples INTEGER, {rollup_columns})')
+        conn.commit()
+
+    def _is_writer(self):
+        """多进程部署时只由持有文件锁的进程写入，避免重复数据"""
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return True
+        if fcntl is None:
+            self._writer_pid = pid
+            return True
+        if self._lock_file is None or self._lock_file[0] != pid:
+            self._lock_file = (pid, open(self.path + '.lock', 'a'))
+        try:
+            fcntl.flock(self._lock_file[1], fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._writer_pid = pid
+        return True
+
+    def record(self, snapshot):
+        """写入一条原始数据，跨越分钟/小时边界时汇总上一级"""
+        if not self.enabled or not self._is_writer():
+            return
+        ts = int(snapshot['timestamp'])
+        values = [func(snapshot) for _, func in FIELDS]
+        conn = self._connect()
+        conn.execute(
+            f'INSERT OR REPLACE INTO {TIER_RAW[0]} (ts, {", ".join(FIELD_NAMES)}) '
+            f'VALUES (?, {", ".join("?" * len(FIELD_NAMES))})',
+            [ts] + values
+        )
+        minute = ts - ts % 60
+        if self._last_minute is not None and minute > self._last_minute:
+            self._rollup(conn, TIER_RAW, TIER_MINUTE, minute)
+        self._last_minute = minute
+
+        hour = ts - ts % 3600
+        if self._last_hour is not None and hour > self._last_hour:
+            self._rollup(conn, TIER_MINUTE, TIER_HOUR, hour)
+            self._prune(conn, ts)
+        self._last_hour = hour
+        conn.commit()
+
+    def _rollup(self, conn, source, target, until):
+        """将source级别中target尚未汇总的完整桶(until之前)一次性汇总到target"""
+        source_table, _ = source
+        target_table, width = target
+        last = conn.execute(f'SELECT MAX(ts) FROM {target_table}').fetchone()[0]
+        start = last + width if last is not None else 0
+        if source is TIER_RAW:
+            columns = ', '.join(f'AVG({n}), MAX({n})' for n in FIELD_NAMES)
+            samples = 'COUNT(*)'
+        else:
+            columns = ', '.join(f'SUM({n}_avg * samples) / SUM(samples), MAX({n}_max)' for n in FIELD_NAMES)
+            samples = 'SUM(samples)'
+        target_columns = ', '.join(f'{n}_avg, {n}_max' for n in FIELD_NAMES)
+        conn.execute(
+            f'INSERT OR REPLACE INTO {target_table} (ts, samples, {target_columns}) '
+            f'SELECT ts - ts % {width} AS bucket, {samples}, {columns} FROM {source_table} '
+            f'WHERE ts >= ? AND ts < ? GROUP BY bucket',
+            (start, until)
+        )
+
+    def _prune(self, conn, now):
+        """按保留期限删除过期数据"""
+        for table, seconds in self.retention.items():
+            conn.execute(f'DELETE FROM {table} WHERE ts < ?', (now - seconds,))
+
+    def query(self, start, end, resolution='auto', max_points=1000):
+        """
+        查询时间范围内的指标序列
+        :param start: 开始时间戳(秒)
+        :param end: 结束时间戳(秒)
+        :param resolution: raw / 1m / 1h / auto(按跨度选择点数不超过max_points的最细级别)
+        :return: (resolution, 数据点列表)
+        """
+        if not self.enabled:
+            return resolution, []
+        if resolution not in TIERS:
+            span = max(end - start, 1)
+            if span <= max_points * self.interval:
+                resolution = 'raw'
+            elif span <= max_points * 60:
+                resolution = '1m'
+            else:
+                resolution = '1h'
+        table, _ = TIERS[resolution]
+        if resolution == 'raw':
+            columns = FIELD_NAMES
+        else:
+            columns = [f'{n}_{suffix}' for n in FIELD_NAMES for suffix in ('avg', 'max')]
+        rows = self._connect().execute(
+            f'SELECT ts, {", ".join(columns)} FROM {table} WHERE ts >= ? AND ts <= ? ORDER BY ts',
+            (int(start), int(end))
+        ).fetchall()
+        points = []
+        for row in rows:
+            point = {'timestamp': row[0],
+                     'time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row[0]))}
+            point.update(zip(columns, (round(v, 2) if v is not None else None for v in row[1:])))
+            points.append(point)
+        return resolution, points
+
+
+metrics_store = MetricsStore()
@@ -0,0 +1,128 @@
+"""
+数据库结构升级 - 为已有数据库补建模型中新增的表、列和索引(只增不改不删，可重复执行)，
+并按parent_id重建旧版本未维护的部门祖级列表；
+应用启动时自动执行(DATABASE_AUTO_UPGRADE)；未初始化的空数据库不处理，由init_db.py建表
+用法:
+    python -m app.migrate                  # 按FLASK_CONFIG对应的数据库升级
+    python -m app.migrate --config production
+"""
+import os
+import sys
+import argparse
+from sqlalchemy import inspect, select, update, or_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+
+def _add_column(conn, table, column):
+    """ALTER TABLE ADD COLUMN，新列对已有行取服务端默认值或NULL"""
+    if column.primary_key or (not column.nullable and column.server_default is None):
+        raise RuntimeError(f'无法为已有表 {table.name} 自动添加非空列 {column.name}，请手工迁移')
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+
+
+def upgrade_schema(engine, metadata):
+    """
+    补建缺失的表(含其索引和建表事件中的全文索引)、列和索引
+    多个进程同时启动时可能同时执行，建表、加列冲突时以重新检查的结果为准，索引使用IF NOT EXISTS
+    :return: 执行的变更说明列表
+    """
+    changes = []
+    existing_tables = set(inspect(engine).get_table_names())
+    if not existing_tables:
+        return changes
+
+    for table in metadata.sorted_tables:
+        if table.name in existing_tables:
+            continue
+        try:
+            # create_all会同时建索引并触发after_create事件(如全文索引)
+            metadata.create_all(engine, tables=[table])
+        except OperationalError:
+            # 其他进程已建表
+            if not inspect(engine).has_table(table.name):
+                raise
+            continue
+        changes.append(f'新建表 {table.name}')
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        inspector = inspect(engine)
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            try:
+                with engine.begin() as conn:
+                    _add_column(conn, table, column)
+            except OperationalError:
+                # 其他进程已添加
+                if column.name not in {c['name'] for c in inspect(engine).get_columns(table.name)}:
+                    raise
+                continue
+            changes.append(f'添加列 {table.name}.{column.name}')
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                with engine.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+                changes.append(f'创建索引 {index.name}')
+    return changes
+
+
+def rebuild_dept_ancestors():
+    """
+    按parent_id重建部门祖级列表: 旧版本新增部门时未维护ancestors(为空)，下级部门查询和移动子树依赖该字段
+    只在存在空祖级列表时执行，与计算结果相同的行不更新
+    :return: 更新的行数
+    """
+    from app.models import db, Dept
+    from app.utils import get_ancestors
+    empty = select(Dept.dept_id).where(or_(Dept.ancestors.is_(None), Dept.ancestors == '')).limit(1)
+    if db.session.scalar(empty) is None:
+        return 0
+    rows = db.session.execute(select(Dept.dept_id, Dept.parent_id, Dept.ancestors)).all()
+    dept_dict = {dept_id: {'parent_id': parent_id} for dept_id, parent_id, _ in rows}
+    count = 0
+    for dept_id, _, ancestors in rows:
+        value = get_ancestors(dept_id, dept_dict)
+        if value != ancestors:
+            db.session.execute(update(Dept).where(Dept.dept_id == dept_id).values(ancestors=value))
+            count += 1
+    db.session.commit()
+    return count
+
+
+def upgrade_database(app):
+    """升级主库结构(只读库由主库复制，不在此处理)"""
+    from app.models import db, Dept
+    with app.app_context():
+        changes = upgrade_schema(db.engine, db.metadata)
+        if inspect(db.engine).has_table(Dept.__tablename__):
+            count = rebuild_dept_ancestors()
+            if count:
+                changes.append(f'重建部门祖级列表 {count} 行')
+    for change in changes:
+        app.logger.info('数据库升级: %s', change)
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='为已有数据库补建新增的表、列和索引')
+    parser.add_argument('--config', default=os.environ.get('FLASK_CONFIG', 'default'), help='应用配置名')
+    options = parser.parse_args()
+
+    from app import create_app
+    app = create_app(options.config)
+    # 启动时已自动升级(DATABASE_AUTO_UPGRADE)的数据库再次执行无变更
+    changes = upgrade_database(app)
+    for change in changes:
+        print(change)
+    print(f'共 {len(changes)} 项变更' if changes else '数据库结构已是最新')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,8 +5,9 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 # 用户角色关联表
@@ -37,6 +38,11 @@ user_post = db.Table('sys_user_post',
 class User(UserMixin, db.Model):
     """用户表"""
     __tablename__ = 'sys_user'
+    __table_args__ = (
+        db.Index('idx_sys_user_list', 'del_flag', 'create_time'),  # 用户列表: 未删除 + 按创建时间排序
+        db.Index('idx_sys_user_dept', 'dept_id', 'del_flag'),
+        db.Index('idx_sys_user_status', 'status', 'del_flag'),
+    )
     
     user_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     dept_id = db.Column(db.Integer, db.ForeignKey('sys_dept.dept_id'))
@@ -75,25 +81,27 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password, password)
     
+    def get_permissions(self):
+        """获取编译后的权限集合(见app.permissions)"""
+        from app.permissions import get_permissions
+        return get_permissions(self.user_id)
+    
     def is_admin(self):
         """是否是管理员"""
-        return any(role.role_key == 'admin' for role in self.roles)
+        return self.get_permissions().is_admin
     
     def has_permission(self, permission):
         """检查是否有指定权限"""
-        if self.is_admin():
-            return True
-        for role in self.roles:
-            if role.status == '0':  # 角色正常状态
-                for menu in role.menus:
-                    if menu.perms and permission in menu.perms:
-                        return True
-        return False
+        permission_set = self.get_permissions()
+        return permission_set.is_admin or permission in permission_set.perms
 
 
 class Role(db.Model):
     """角色表"""
     __tablename__ = 'sys_role'
+    __table_args__ = (
+        db.Index('idx_sys_role_list', 'del_flag', 'role_sort'),
+    )
     
     role_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     role_name = db.Column(db.String(30), nullable=False)
@@ -116,6 +124,10 @@ class Role(db.Model):
 class Menu(db.Model):
     """菜单表"""
     __tablename__ = 'sys_menu'
+    __table_args__ = (
+        db.Index('idx_sys_menu_parent', 'parent_id', 'order_num'),
+        db.Index('idx_sys_menu_visible', 'visible', 'menu_type'),
+    )
     
     menu_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     menu_name = db.Column(db.String(50), nullable=False)
@@ -138,10 +150,13 @@ class Menu(db.Model):
 class Dept(db.Model):
     """部门表"""
     __tablename__ = 'sys_dept'
+    __table_args__ = (
+        db.Index('idx_sys_dept_parent', 'parent_id', 'order_num'),
+    )
     
     dept_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     parent_id = db.Column(db.Integer, default=0)
-    ancestors = db.Column(db.String(50), default='')  # 祖级列表
+    ancestors = db.Column(db.String(500), default='', index=True)  # 祖级列表，如 0,100,101
     dept_name = db.Column(db.String(30), nullable=False)
     order_num = db.Column(db.Integer, default=0)
     leader = db.Column(db.String(20))
@@ -153,6 +168,25 @@ class Dept(db.Model):
     create_time = db.Column(db.DateTime, default=datetime.now)
     update_by = db.Column(db.String(64))
     update_time = db.Column(db.DateTime, onupdate=datetime.now)
+    
+    @property
+    def path(self):
+        """本部门的物化路径(祖级列表+自身ID)，即其下级部门ancestors的前缀"""
+        if not self.ancestors:
+            # 旧版本新增的部门未维护祖级列表，猜测的路径会漏掉下级部门
+            raise ValueError(f'部门 {self.dept_id} 的祖级列表为空，请执行 python -m app.migrate 重建')
+        return f'{self.ancestors},{self.dept_id}'
+    
+    @staticmethod
+    def subtree_filter(path):
+        """
+        下级部门过滤条件(按ancestors前缀范围匹配，可使用索引)
+        ',' 的下一个字符为 '-'，因此 [path + ',', path + '-') 即所有以 path + ',' 开头的值
+        """
+        return db.or_(
+            Dept.ancestors == path,
+            db.and_(Dept.ancestors >= path + ',', Dept.ancestors < path + '-')
+        )
 
 
 class Post(db.Model):
@@ -189,6 +223,10 @@ class DictType(db.Model):
 class DictData(db.Model):
     """字典数据表"""
     __tablename__ = 'sys_dict_data'
+    __table_args__ = (
+        db.Index('idx_sys_dict_data_type', 'dict_type', 'status', 'dict_sort'),  # 按类型加载字典
+        db.Index('idx_sys_dict_data_value', 'dict_type', 'dict_value'),
+    )
     
     dict_code = db.Column(db.Integer, primary_key=True, autoincrement=True)
     dict_sort = db.Column(db.Integer, default=0)
@@ -241,10 +279,13 @@ class Notice(db.Model):
 class OperLog(db.Model):
     """操作日志表"""
     __tablename__ = 'sys_oper_log'
+    __table_args__ = (
+        db.Index('idx_sys_oper_log_time', 'oper_time', 'oper_id'),
+    )
     
     oper_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(50))  # 模块标题
-    business_type = db.Column(db.Integer, default=0)  # 业务类型：0其它 1新增 2修改 3删除
+    business_type = db.Column(db.Integer, default=0)  # 业务类型：0其它 1新增 2修改 3删除 6导入 7强退
     method = db.Column(db.String(100))  # 方法名称
     request_method = db.Column(db.String(10))  # 请求方式
     operator_type = db.Column(db.Integer, default=0)  # 操作类别：0其它 1后台用户 2手机端用户
@@ -258,11 +299,15 @@ class OperLog(db.Model):
     status = db.Column(db.Integer, default=0)  # 操作状态：0正常 1异常
     error_msg = db.Column(db.Text)  # 错误消息
     oper_time = db.Column(db.DateTime, default=datetime.now)
+    cost_time = db.Column(db.Integer, default=0)  # 消耗时间(毫秒)
 
 
 class LoginInfo(db.Model):
     """登录日志表"""
     __tablename__ = 'sys_logininfor'
+    __table_args__ = (
+        db.Index('idx_sys_logininfor_time', 'login_time', 'info_id'),
+    )
     
     info_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     login_name = db.Column(db.String(50))  # 登录账号
@@ -278,6 +323,10 @@ class LoginInfo(db.Model):
 class OnlineUser(db.Model):
     """在线用户表"""
     __tablename__ = 'sys_user_online'
+    __table_args__ = (
+        db.Index('idx_sys_user_online_list', 'status', 'last_access_time'),  # 在线列表
+        db.Index('idx_sys_user_online_expire', 'expire_time', 'last_access_time'),  # 过期清理
+    )
     
     sessionId = db.Column(db.String(50), primary_key=True)
     login_name = db.Column(db.String(50))
@@ -314,6 +363,10 @@ class Job(db.Model):
 class JobLog(db.Model):
     """定时任务日志表"""
     __tablename__ = 'sys_job_log'
+    __table_args__ = (
+        db.Index('idx_sys_job_log_time', 'create_time', 'job_log_id'),
+        db.Index('idx_sys_job_log_name', 'job_name', 'create_time', 'job_log_id'),  # 按任务名筛选并按时间排序
+    )
     
     job_log_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     job_name = db.Column(db.String(64), nullable=False)
@@ -323,3 +376,37 @@ class JobLog(db.Model):
     status = db.Column(db.String(1), default='0')  # 执行状态：0正常 1失败
     exception_info = db.Column(db.Text)  # 异常信息
     create_time = db.Column(db.DateTime, default=datetime.now)
+
+
+class JobStats(db.Model):
+    """定时任务执行统计表(每次执行后增量更新，读取时无需聚合日志)"""
+    __tablename__ = 'sys_job_stats'
+    
+    job_id = db.Column(db.Integer, primary_key=True)
+    run_count = db.Column(db.Integer, default=0)  # 执行次数
+    fail_count = db.Column(db.Integer, default=0)  # 失败次数
+    total_time = db.Column(db.BigInteger, default=0)  # 累计耗时(毫秒)
+    max_time = db.Column(db.Integer, default=0)  # 最大耗时(毫秒)
+    histogram = db.Column(db.Text)  # 耗时分布直方图(JSON数组，用于计算分位数)
+    p50_time = db.Column(db.Integer, default=0)  # 耗时中位数(毫秒)
+    p95_time = db.Column(db.Integer, default=0)  # 耗时95分位(毫秒)
+    last_run_time = db.Column(db.DateTime)  # 最后执行时间
+    last_status = db.Column(db.String(1))  # 最后执行状态：0正常 1失败
+    last_duration = db.Column(db.Integer)  # 最后执行耗时(毫秒)
+
+
+class JobLease(db.Model):
+    """定时任务执行租约表(多进程部署时保证每个触发时间只执行一次)"""
+    __tablename__ = 'sys_job_lease'
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'fire_time', name='uk_sys_job_lease_fire'),
+        db.Index('idx_sys_job_lease_status', 'status', 'heartbeat_time'),
+    )
+    
+    lease_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_id = db.Column(db.Integer, nullable=False)
+    fire_time = db.Column(db.DateTime, nullable=False)  # 计划触发时间
+    owner = db.Column(db.String(100), nullable=False)  # 持有者(主机名:进程号)
+    status = db.Column(db.String(1), default='0')  # 0执行中 1已完成
+    heartbeat_time = db.Column(db.DateTime, default=datetime.now)  # 最后心跳时间
+    create_time = db.Column(db.DateTime, default=datetime.now)
@@ -0,0 +1,181 @@
+"""
+在线会话跟踪 - 请求中只在内存记录访问时间，后台线程每隔一段时间批量更新
+sys_user_online.last_access_time，并清理超过expire_time的会话；
+被强退或过期的会话在下一次请求时注销登录；
+注销名单只在各进程内存中: 执行强退的进程立即生效，其他进程在下一次批量更新(ONLINE_FLUSH_INTERVAL)
+发现在线记录已删除后才注销，在此之前该会话在其他进程上仍可访问
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import session, request
+from flask_login import current_user, logout_user
+from sqlalchemy import update, delete, select, bindparam
+from app.models import db, OnlineUser
+
+logger = logging.getLogger(__name__)
+
+# flask session中保存在线会话ID和登录时间的键
+SESSION_KEY = 'online_session_id'
+SESSION_LOGIN_KEY = 'online_login_time'
+
+
+class OnlineTracker:
+    """在线会话跟踪器"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.flush_interval = 60
+        self.sweep_interval = 60
+        self.revoke_grace = 30
+        self.revoke_ttl = 7200
+        self.multi_session = False
+        self._pending = {}  # sessionId -> (最后访问时间, 登录时间戳, 登录名)
+        self._revoked = {}  # sessionId -> 注销时间戳
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('ONLINE_FLUSH_INTERVAL', 60)
+        self.sweep_interval = app.config.get('ONLINE_SWEEP_INTERVAL', 60)
+        self.revoke_grace = app.config.get('ONLINE_REVOKE_GRACE', 30)
+        self.revoke_ttl = app.config['PERMANENT_SESSION_LIFETIME'].total_seconds()
+        self.multi_session = app.config.get('ONLINE_MULTI_SESSION', False)
+        app.extensions['online_tracker'] = self
+        app.before_request(self._before_request)
+
+    def _before_request(self):
+        """记录访问时间；会话已被强退或过期时注销登录"""
+        if request.endpoint == 'static':
+            return
+        session_id = session.get(SESSION_KEY)
+        if not session_id or not current_user.is_authenticated:
+            return
+        if session_id in self._revoked:
+            logout_user()
+            session.pop(SESSION_KEY, None)
+            session.pop(SESSION_LOGIN_KEY, None)
+            return
+        self.touch(session_id, session.get(SESSION_LOGIN_KEY, 0), current_user.login_name)
+
+    def touch(self, session_id, login_time=0, login_name=None):
+        """记录一次访问(只写内存，O(1))"""
+        self._ensure_started()
+        with self._lock:
+            self._pending[session_id] = (datetime.now(), login_time, login_name)
+
+    def revoke(self, session_ids):
+        """注销会话(本进程立即生效，其他进程在下次批量更新时发现记录已删除)"""
+        now = time.time()
+        with self._lock:
+            for session_id in session_ids:
+                self._revoked[session_id] = now
+                self._pending.pop(session_id, None)
+
+    def force_logout(self, session_ids):
+        """强退: 删除在线记录并注销会话"""
+        session_ids = list(session_ids)
+        if not session_ids:
+            return 0
+        result = db.session.execute(delete(OnlineUser).where(OnlineUser.sessionId.in_(session_ids)))
+        db.session.commit()
+        self.revoke(session_ids)
+        return result.rowcount
+
+    # 后台线程
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._pending = {}
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='online-tracker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last_sweep = 0
+        while not self._stop.wait(self.flush_interval):
+            try:
+                with self.app.app_context():
+                    self.flush()
+                    if time.monotonic() - last_sweep >= self.sweep_interval:
+                        self.sweep()
+                        last_sweep = time.monotonic()
+                    db.session.remove()
+            except Exception:
+                logger.exception('在线会话更新失败')
+
+    def flush(self):
+        """批量更新访问时间，并找出已被其他进程删除的会话"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        # 按主键批量更新(executemany)，已被删除的会话不报错
+        table = OnlineUser.__table__
+        db.session.execute(
+            update(table).where(table.c.sessionId == bindparam('sid')).values(last_access_time=bindparam('t')),
+            [{'sid': session_id, 't': access_time} for session_id, (access_time, _, _) in pending.items()]
+        )
+        db.session.commit()
+
+        # 登录记录由审计写入器异步插入，登录后一段时间内不据此判断强退
+        deadline = time.time() - self.revoke_grace
+        candidates = [sid for sid, (_, login_time, _) in pending.items() if login_time and login_time < deadline]
+        if candidates:
+            existing = set(db.session.execute(
+                select(OnlineUser.sessionId).where(OnlineUser.sessionId.in_(candidates))
+            ).scalars())
+            missing = [sid for sid in candidates if sid not in existing]
+            if missing and not self.multi_session:
+                # 新登录替换了同账号的在线记录: 被替换的会话仍保持登录，账号已无在线记录时才注销
+                names = {pending[sid][2] for sid in missing}
+                online_names = set(db.session.execute(
+                    select(OnlineUser.login_name).where(OnlineUser.login_name.in_(names)).distinct()
+                ).scalars())
+                missing = [sid for sid in missing if pending[sid][2] not in online_names]
+            if missing:
+                self.revoke(missing)
+        self._prune_revoked()
+
+    def sweep(self):
+        """一条语句删除超过expire_time(分钟)未访问的会话"""
+        now = datetime.now()
+        expire_values = db.session.execute(select(OnlineUser.expire_time).distinct()).scalars().all()
+        conditions = [
+            db.and_(OnlineUser.expire_time == minutes,
+                    OnlineUser.last_access_time < now - timedelta(minutes=minutes))
+            for minutes in expire_values if minutes
+        ]
+        if not conditions:
+            return 0
+        expired = db.or_(*conditions)
+        session_ids = db.session.execute(select(OnlineUser.sessionId).where(expired)).scalars().all()
+        if not session_ids:
+            return 0
+        db.session.execute(delete(OnlineUser).where(expired))
+        db.session.commit()
+        self.revoke(session_ids)
+        return len(session_ids)
+
+    def _prune_revoked(self):
+        """超过会话有效期的注销记录不再需要保留"""
+        deadline = time.time() - self.revoke_ttl
+        with self._lock:
+            for session_id in [sid for sid, t in self._revoked.items() if t < deadline]:
+                del self._revoked[session_id]
+
+
+online_tracker = OnlineTracker()
@@ -0,0 +1,55 @@
+"""
+权限索引 - 按用户编译权限集合并缓存，权限检查为O(1)集合查找
+"""
+from collections import namedtuple
+from app.models import db, Role, Menu, user_role, role_menu
+from app.cache import cache
+from app import versions
+
+# 影响用户权限的表
+PERMISSION_TABLES = ('sys_user_role', 'sys_role', 'sys_role_menu', 'sys_menu')
+
+PermissionSet = namedtuple('PermissionSet', ['is_admin', 'perms', 'role_ids'])
+
+
+def split_perms(perms):
+    """拆分菜单权限标识(支持逗号分隔多个)"""
+    if not perms:
+        return []
+    return [p.strip() for p in perms.split(',') if p.strip()]
+
+
+def compile_permissions(user_id):
+    """一次查询编译用户的权限集合"""
+    rows = db.session.query(
+        Role.role_id, Role.role_key, Role.status, Menu.perms
+    ).select_from(user_role).join(
+        Role, Role.role_id == user_role.c.role_id
+    ).outerjoin(
+        role_menu, role_menu.c.role_id == Role.role_id
+    ).outerjoin(
+        Menu, Menu.menu_id == role_menu.c.menu_id
+    ).filter(
+        user_role.c.user_id == user_id
+    ).all()
+
+    is_admin = False
+    perms = set()
+    role_ids = set()
+    for role_id, role_key, status, menu_perms in rows:
+        if role_key == 'admin':
+            is_admin = True
+        if status == '0':  # 角色正常状态
+            role_ids.add(role_id)
+            perms.update(split_perms(menu_perms))
+    return PermissionSet(is_admin, frozenset(perms), tuple(sorted(role_ids)))
+
+
+def get_permissions(user_id):
+    """获取用户权限集合(缓存，相关表变更后自动重建)"""
+    return cache.get_or_load(f'perm:{user_id}', lambda: compile_permissions(user_id), PERMISSION_TABLES)
+
+
+def clear_permission_cache():
+    """清空权限缓存"""
+    versions.bump(*PERMISSION_TABLES)
@@ -0,0 +1,85 @@
+"""
+读写分离 - 标记为只读的接口中，查询语句发送到只读库(SQLALCHEMY_BINDS['replica'])；
+写语句、本次请求已有写入、以及用户自己刚写入后的一段时间内(读己之写)仍使用主库
+"""
+import time
+from functools import wraps
+from flask import g, has_request_context, current_app, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+# g中标记当前请求可使用只读库
+READ_ONLY_FLAG = '_db_read_only'
+# flask session中记录用户最近写入后需读主库的截止时间
+STICKY_KEY = '_db_primary_until'
+# session.info中标记本事务已有写入
+_WROTE_KEY = '_db_wrote'
+
+
+class RoutingSession(Session):
+    """按请求是否只读选择主库或只读库的Session"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if not has_request_context() or not g.get(READ_ONLY_FLAG):
+            return False
+        if self._flushing or self.info.get(_WROTE_KEY):
+            return False
+        # 只有SELECT语句走只读库
+        return clause is None or getattr(clause, 'is_select', False)
+
+
+def read_only(func):
+    """
+    只读接口装饰器: 查询发送到只读库(未配置只读库时无影响)
+    用户最近REPLICA_STICKY_SECONDS秒内有过写入时仍读主库，保证能读到自己的修改
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if http_session.get(STICKY_KEY, 0) > time.time():
+            return func(*args, **kwargs)
+        setattr(g, READ_ONLY_FLAG, True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            g.pop(READ_ONLY_FLAG, None)
+    return wrapper
+
+
+def _mark_flush(session, flush_context):
+    session.info[_WROTE_KEY] = True
+
+
+def _mark_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[_WROTE_KEY] = True
+
+
+def _after_commit(session):
+    """请求中提交了写入: 记录该用户在复制延迟窗口内读主库"""
+    if session.info.pop(_WROTE_KEY, False) and has_request_context():
+        sticky = current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+        if sticky:
+            http_session[STICKY_KEY] = time.time() + sticky
+
+
+def _after_rollback(session):
+    session.info.pop(_WROTE_KEY, None)
+
+
+def register_routing_listeners():
+    """注册写入跟踪事件"""
+    if event.contains(RoutingSession, 'after_commit', _after_commit):
+        return
+    event.listen(RoutingSession, 'after_flush', _mark_flush)
+    event.listen(RoutingSession, 'do_orm_execute', _mark_execute)
+    event.listen(RoutingSession, 'after_commit', _after_commit)
+    event.listen(RoutingSession, 'after_rollback', _after_rollback)
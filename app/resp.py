@@ -0,0 +1,306 @@
+"""
+Redis协议(RESP)客户端及本地缓存服务 - 客户端只实现缓存用到的命令；
+本地服务实现同样的命令子集，开发测试时可代替Redis:
+    python -m app.resp --port 6390
+"""
+import os
+import time
+import socket
+import argparse
+import threading
+import socketserver
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """服务端返回的错误"""
+
+
+def encode_command(args):
+    """编码为RESP数组"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode('utf-8')
+        else:
+            data = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+def read_reply(reader):
+    """从文件对象读取一个RESP回复"""
+    line = reader.readline()
+    if not line:
+        raise ConnectionError('连接已关闭')
+    kind, body = line[:1], line[1:-2]
+    if kind == b'+':
+        return body.decode('utf-8')
+    if kind == b'-':
+        return RespError(body.decode('utf-8'))
+    if kind == b':':
+        return int(body)
+    if kind == b'$':
+        length = int(body)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(body)
+        if count < 0:
+            return None
+        return [read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f'无法解析的回复: {line!r}')
+
+
+class RespClient:
+    """线程安全的RESP客户端(单连接，命令串行执行)"""
+
+    def __init__(self, url, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        for args in setup:
+            sock.sendall(encode_command(args))
+            reply = read_reply(reader)
+            if isinstance(reply, RespError):
+                sock.close()
+                raise reply
+        return sock, reader
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def pipeline(self, commands):
+        """一次往返发送多条命令，返回对应的回复列表"""
+        with self._lock:
+            if self._sock is None or self._pid != os.getpid():
+                # fork后子进程不复用父进程的连接
+                self._sock, self._reader = self._connect()
+                self._pid = os.getpid()
+            try:
+                self._sock.sendall(b''.join(encode_command(args) for args in commands))
+                replies = [read_reply(self._reader) for _ in commands]
+            except (OSError, ConnectionError):
+                self._close()
+                raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def ping(self):
+        return self.execute('PING') == 'PONG'
+
+    def get(self, key):
+        return self.execute('GET', key)
+
+    def mget(self, *keys):
+        return self.execute('MGET', *keys)
+
+    def set(self, key, value, px=None):
+        if px:
+            return self.execute('SET', key, value, 'PX', int(px))
+        return self.execute('SET', key, value)
+
+    def delete(self, *keys):
+        return self.execute('DEL', *keys)
+
+    def incr(self, key):
+        return self.execute('INCR', key)
+
+    def publish(self, channel, message):
+        return self.execute('PUBLISH', channel, message)
+
+    def listen(self, channel):
+        """订阅频道(独立连接)，订阅成功时返回None，之后逐条返回消息内容；连接断开时抛出异常"""
+        sock, reader = self._connect()
+        sock.settimeout(None)
+        try:
+            sock.sendall(encode_command(('SUBSCRIBE', channel)))
+            while True:
+                reply = read_reply(reader)
+                if isinstance(reply, list) and len(reply) == 3:
+                    if reply[0] == b'message':
+                        yield reply[2]
+                    elif reply[0] == b'subscribe':
+                        yield None  # 订阅成功
+        finally:
+            sock.close()
+
+
+# 本地缓存服务
+
+class _Store:
+    """本地服务的数据: 键值(带过期时间)和订阅者"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}  # key -> (value, expire_at或None)
+        self.channels = {}  # channel -> set(handler)
+
+    def get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expire_at = item
+        if expire_at is not None and expire_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """处理一个客户端连接"""
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+
+    def send(self, data):
+        with self.write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def handle(self):
+        store = self.server.store
+        try:
+            while True:
+                args = read_reply(self.rfile)
+                if not isinstance(args, list) or not args:
+                    return
+                self.send(self.dispatch(store, args))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with store.lock:
+                for handlers in store.channels.values():
+                    handlers.discard(self)
+
+    def dispatch(self, store, args):
+        command = args[0].decode('utf-8').upper()
+        args = args[1:]
+        with store.lock:
+            if command == 'PING':
+                return b'+PONG\r\n'
+            if command in ('SELECT', 'AUTH'):
+                return b'+OK\r\n'
+            if command == 'GET':
+                return _bulk(store.get(args[0]))
+            if command == 'MGET':
+                values = [store.get(key) for key in args]
+                return b'*%d\r\n' % len(values) + b''.join(_bulk(v) for v in values)
+            if command == 'SET':
+                expire_at = None
+                if len(args) >= 4 and args[2].upper() == b'PX':
+                    expire_at = time.monotonic() + int(args[3]) / 1000
+                elif len(args) >= 4 and args[2].upper() == b'EX':
+                    expire_at = time.monotonic() + int(args[3])
+                store.data[args[0]] = (args[1], expire_at)
+                return b'+OK\r\n'
+            if command == 'DEL':
+                count = sum(1 for key in args if store.data.pop(key, None) is not None)
+                return b':%d\r\n' % count
+            if command == 'INCR':
+                value = int(store.get(args[0]) or 0) + 1
+                store.data[args[0]] = (str(value).encode(), None)
+                return b':%d\r\n' % value
+            if command == 'FLUSHDB':
+                store.data.clear()
+                return b'+OK\r\n'
+            if command == 'SUBSCRIBE':
+                replies = []
+                for index, channel in enumerate(args, 1):
+                    store.channels.setdefault(channel, set()).add(self)
+                    replies.append(b'*3\r\n' + _bulk(b'subscribe') + _bulk(channel) + b':%d\r\n' % index)
+                return b''.join(replies)
+            if command == 'PUBLISH':
+                handlers = list(store.channels.get(args[0], ()))
+                message = encode_command((b'message', args[0], args[1]))
+        if command == 'PUBLISH':
+            delivered = 0
+            for handler in handlers:
+                try:
+                    handler.send(message)
+                    delivered += 1
+                except OSError:
+                    pass
+            return b':%d\r\n' % delivered
+        return b'-ERR unknown command\r\n'
+
+
+def _bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class LocalCacheServer(socketserver.ThreadingTCPServer):
+    """本地缓存服务(Redis命令子集: GET/SET/MGET/DEL/INCR/PUBLISH/SUBSCRIBE)"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=6390):
+        super().__init__((host, port), _Handler)
+        self.store = _Store()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        """在后台线程中运行"""
+        thread = threading.Thread(target=self.serve_forever, name='local-cache-server', daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地缓存服务(Redis协议子集)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    options = parser.parse_args()
+    server = LocalCacheServer(options.host, options.port)
+    print(f'本地缓存服务已启动: {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+响应层 - JSON响应压缩(gzip/brotli)和基于数据版本号的条件请求:
+列表接口的ETag由依赖表的版本号计算，If-None-Match匹配时直接返回304，不执行查询
+"""
+import os
+import gzip
+import time
+import uuid
+import hashlib
+from functools import wraps
+from flask import request, make_response, current_app
+from flask_login import current_user
+from app import versions
+from app.assets import accepted_encodings
+from app.cache import cache
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只使用gzip
+    brotli = None
+
+# 进程标识: 各进程的本地版本号互不相关，未启用共享缓存时ETag只在本进程内有效
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+# 不参与ETag计算的查询参数(jQuery cache:false 附加的时间戳)
+IGNORED_ARGS = ('_',)
+
+# 压缩后的ETag后缀，比较时去掉
+_ENCODING_SUFFIXES = ('-br', '-gzip')
+
+
+def _compress_gzip(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_br(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _encoders():
+    """编码名 -> (压缩函数, 配置的压缩级别键, 默认级别)，按优先顺序"""
+    encoders = []
+    if brotli is not None:
+        encoders.append(('br', _compress_br, 'RESPONSE_BROTLI_LEVEL', 4))
+    encoders.append(('gzip', _compress_gzip, 'RESPONSE_GZIP_LEVEL', 6))
+    return encoders
+
+
+def compute_etag(tables):
+    """
+    根据依赖表版本号、当前用户和请求参数计算ETag
+    共享缓存可用时使用全局版本号(各进程一致)，否则使用本进程版本号；
+    另加入时间窗口，其他进程未能通知的修改最多在ETAG_MAX_AGE秒后可见
+    """
+    generations = cache.generations(tables)
+    if generations is None:
+        generations = (_PROCESS_TOKEN, os.getpid()) + versions.table_version(*tables)
+    window = current_app.config.get('ETAG_MAX_AGE', 60)
+    args = sorted((key, value) for key, value in request.args.items(multi=True) if key not in IGNORED_ARGS)
+    user_id = current_user.get_id() if current_user.is_authenticated else ''
+    key = repr((request.path, args, user_id, generations, int(time.time() // window) if window else 0))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _strip_suffix(tag):
+    for suffix in _ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+def etag_matches(etag):
+    """If-None-Match中是否包含该ETag(忽略压缩后缀和弱标记)"""
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return True
+    return any(_strip_suffix(tag) == etag for tag in if_none_match.as_set(include_weak=True))
+
+
+def versioned(*tables):
+    """
+    列表接口条件请求装饰器，tables为响应数据依赖的表
+    ETag未变化时返回304(不执行查询)；否则执行查询并在响应中带上ETag，浏览器每次请求重新验证
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('ETAG_ENABLED', True):
+                return func(*args, **kwargs)
+            etag = compute_etag(tables)
+            if etag_matches(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+class ResponseCompressor:
+    """超过阈值的JSON响应按客户端Accept-Encoding压缩"""
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.mimetypes = ('application/json',)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config.get('RESPONSE_COMPRESS_MIN_SIZE', 1024)
+        self.mimetypes = tuple(app.config.get('RESPONSE_COMPRESS_MIMETYPES', self.mimetypes))
+        if app.config.get('RESPONSE_COMPRESS_ENABLED', True):
+            app.after_request(self.compress)
+
+    def compress(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or response.mimetype not in self.mimetypes or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+        for encoding, compress, level_key, level in _encoders():
+            if encoding in accepted:
+                response.set_data(compress(data, current_app.config.get(level_key, level)))
+                response.headers['Content-Encoding'] = encoding
+                etag, weak = response.get_etag()
+                if etag:
+                    # 不同编码的内容不同，强ETag需加以区分
+                    response.set_etag(f'{etag}-{encoding}', weak)
+                break
+        return response
+
+
+compressor = ResponseCompressor()
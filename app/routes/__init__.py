@@ -3,7 +3,9 @@
 """
 from flask import Blueprint, render_template, redirect, url_for
 from flask_login import login_required, current_user
-from app.models import Menu, db
+from app.models import Menu, db, role_menu
+from app.cache import cache
+from app.utils import build_tree
 
 main_bp = Blueprint('main', __name__)
 
@@ -36,37 +38,45 @@ def main_content():
     return render_template('main.html', user=current_user)
 
 
+# 菜单树缓存，键为角色ID集合，角色相同的用户共享同一棵树
+MENU_TABLES = ('sys_menu', 'sys_role_menu')
+
+
 def get_user_menus(user):
     """
     获取用户菜单
-    返回树形结构的菜单列表
+    返回树形结构的菜单列表(按角色缓存，菜单或角色菜单变更后失效)
+    """
+    permission_set = user.get_permissions()
+    if permission_set.is_admin:
+        return cache.get_or_load('menu:admin', load_menu_tree, MENU_TABLES)
+    role_ids = permission_set.role_ids
+    if not role_ids:
+        return []
+    key = 'menu:' + ','.join(map(str, role_ids))
+    return cache.get_or_load(key, lambda: load_menu_tree(role_ids), MENU_TABLES)
+
+
+def load_menu_tree(role_ids=None):
+    """
+    从数据库加载菜单树
+    :param role_ids: 角色ID列表，为None时加载全部菜单(管理员)
     """
-    if user.is_admin():
-        # 管理员获取所有菜单
-        all_menus = Menu.query.filter_by(
-            visible='0'
-        ).filter(
-            Menu.menu_type.in_(['M', 'C'])
-        ).order_by(
-            Menu.parent_id, Menu.order_num
-        ).all()
-    else:
+    query = Menu.query.filter_by(
+        visible='0'
+    ).filter(
+        Menu.menu_type.in_(['M', 'C'])
+    )
+    if role_ids is not None:
         # 普通用户根据角色获取菜单
-        menu_ids = set()
-        for role in user.roles:
-            if role.status == '0':  # 角色正常状态
-                for menu in role.menus:
-                    if menu.visible == '0' and menu.menu_type in ['M', 'C']:
-                        menu_ids.add(menu.menu_id)
-        
-        if not menu_ids:
-            return []
-        
-        all_menus = Menu.query.filter(
-            Menu.menu_id.in_(menu_ids)
-        ).order_by(
-            Menu.parent_id, Menu.order_num
-        ).all()
+        query = query.filter(
+            Menu.menu_id.in_(
+                db.session.query(role_menu.c.menu_id).filter(role_menu.c.role_id.in_(role_ids))
+            )
+        )
+    all_menus = query.order_by(
+        Menu.parent_id, Menu.order_num
+    ).all()
     
     # 转换为字典列表
     menu_list = []
@@ -92,14 +102,7 @@ def get_user_menus(user):
 
 def build_menu_tree(menu_list, parent_id=0):
     """构建菜单树"""
-    tree = []
-    for menu in menu_list:
-        if menu['parent_id'] == parent_id:
-            children = build_menu_tree(menu_list, menu['menu_id'])
-            if children:
-                menu['children'] = children
-            tree.append(menu)
-    return tree
+    return build_tree(menu_list, parent_id, id_field='menu_id')
 
 
 def is_mobile_device():
@@ -4,8 +4,11 @@
 from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_login import login_user, logout_user, current_user
-from app.models import db, User, LoginInfo, OnlineUser
+from app.models import db, User, LoginInfo
+from app.audit import audit_writer
+from app.online import SESSION_KEY, SESSION_LOGIN_KEY
 from app.utils import get_client_ip, parse_user_agent, generate_session_id, success_response, error_response
+import time
 import random
 import string
 
@@ -80,10 +83,14 @@ def login():
 @auth_bp.route('/logout')
 def logout():
     """登出"""
+    session_id = session.pop(SESSION_KEY, None)
+    session.pop(SESSION_LOGIN_KEY, None)
     if current_user.is_authenticated:
         # 删除在线用户记录
-        OnlineUser.query.filter_by(login_name=current_user.login_name).delete()
-        db.session.commit()
+        if not current_app.config.get('ONLINE_MULTI_SESSION', False):
+            audit_writer.offline_user(current_user.login_name)
+        elif session_id:
+            audit_writer.offline(session_id)
     
     logout_user()
     flash('您已成功登出系统', 'success')
@@ -220,7 +227,9 @@ def log_login(login_name, status, msg):
     ip = get_client_ip()
     browser, os = parse_user_agent(request.headers.get('User-Agent', ''))
     
-    log = LoginInfo(
+    # 异步批量写入，不在登录请求中提交
+    audit_writer.add(
+        LoginInfo,
         login_name=login_name,
         ipaddr=ip,
         login_location='',  # 可以集成IP定位服务
@@ -230,9 +239,6 @@ def log_login(login_name, status, msg):
         msg=msg,
         login_time=datetime.now()
     )
-    
-    db.session.add(log)
-    db.session.commit()
 
 
 def record_online_user(user):
@@ -241,11 +247,14 @@ def record_online_user(user):
     ip = get_client_ip()
     browser, os = parse_user_agent(request.headers.get('User-Agent', ''))
     
-    # 删除旧的在线记录
-    OnlineUser.query.filter_by(login_name=user.login_name).delete()
+    # 会话中保存在线会话ID，之后的请求据此更新访问时间和判断是否被强退
+    session[SESSION_KEY] = session_id
+    session[SESSION_LOGIN_KEY] = time.time()
     
-    # 创建新记录
-    online_user = OnlineUser(
+    # 异步批量写入，未允许多处登录时替换该账号旧的在线记录
+    if not current_app.config.get('ONLINE_MULTI_SESSION', False):
+        audit_writer.offline_user(user.login_name)
+    audit_writer.online(
         sessionId=session_id,
         login_name=user.login_name,
         dept_name=user.dept.dept_name if user.dept else '',
@@ -258,6 +267,3 @@ def record_online_user(user):
         last_access_time=datetime.now(),
         expire_time=120  # 2小时
     )
-    
-    db.session.add(online_user)
-    db.session.commit()
@@ -1,11 +1,20 @@
 """
 系统监控路由 - 在线用户、定时任务、操作日志、登录日志、服务监控
 """
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app, session
 from flask_login import login_required
-from app.models import db, OnlineUser, Job, JobLog, OperLog, LoginInfo
-from app.decorators import permission_required
-from app.utils import table_response, paginate, success_response, error_response
+from app.models import db, OnlineUser, Job, JobLog, JobStats, OperLog, LoginInfo
+from app.decorators import permission_required, versioned, read_only, oper_log, BUSINESS_FORCE
+from app.audit import audit_writer, latency_stats
+from app.cache import cache
+from app.metrics import server_sampler
+from app.online import online_tracker, SESSION_KEY
+from app.metrics_store import metrics_store
+from app.scheduler import job_scheduler
+from app.export import export_response, iter_rows
+from app.utils import table_response, paginate, keyset_paginate, cursor_total, success_response, error_response
+import time
+import platform
 import psutil
 from datetime import datetime
 
@@ -23,6 +32,8 @@ def online_list():
 @monitor_bp.route('/online/list/data')
 @login_required
 @permission_required('monitor:online:list')
+@versioned('sys_user_online')
+@read_only
 def online_list_data():
     """在线用户列表数据"""
     page = request.args.get('pageNum', 1, type=int)
@@ -50,6 +61,25 @@ def online_list_data():
     return table_response(rows, total)
 
 
+@monitor_bp.route('/online/forceLogout', methods=['POST'])
+@login_required
+@permission_required('monitor:online:forceLogout')
+@oper_log('在线用户', BUSINESS_FORCE)
+def online_force_logout():
+    """强退在线用户(ids为逗号分隔的sessionId)"""
+    session_ids = [sid for sid in request.form.get('ids', '').split(',') if sid]
+    if not session_ids:
+        return error_response('请选择要强退的用户')
+    if session.get(SESSION_KEY) in session_ids:
+        return error_response('当前登录用户无法强退')
+    try:
+        count = online_tracker.force_logout(session_ids)
+        return success_response('强退成功', data={'count': count})
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'强退失败: {str(e)}')
+
+
 @monitor_bp.route('/job/list')
 @login_required
 @permission_required('monitor:job:view')
@@ -58,6 +88,112 @@ def job_list():
     return render_template('monitor/job/job.html')
 
 
+@monitor_bp.route('/job/list/data')
+@login_required
+@permission_required('monitor:job:list')
+@versioned('sys_job', 'sys_job_stats')
+@read_only
+def job_list_data():
+    """定时任务列表数据(含执行统计和下次执行时间)"""
+    page = request.args.get('pageNum', 1, type=int)
+    per_page = request.args.get('pageSize', 10, type=int)
+    job_name = request.args.get('jobName', '').strip()
+    job_group = request.args.get('jobGroup', '').strip()
+    status = request.args.get('status', '').strip()
+    
+    query = db.session.query(Job, JobStats).outerjoin(JobStats, JobStats.job_id == Job.job_id)
+    if job_name:
+        query = query.filter(Job.job_name.like(f'%{job_name}%'))
+    if job_group:
+        query = query.filter(Job.job_group == job_group)
+    if status:
+        query = query.filter(Job.status == status)
+    
+    total = query.count()
+    items = query.order_by(Job.job_id).offset((page - 1) * per_page).limit(per_page).all()
+    
+    rows = []
+    for job, stats in items:
+        next_time = job_scheduler.next_fire_time(job.job_id)
+        row = {
+            'job_id': job.job_id,
+            'job_name': job.job_name,
+            'job_group': job.job_group,
+            'invoke_target': job.invoke_target,
+            'cron_expression': job.cron_expression,
+            'misfire_policy': job.misfire_policy,
+            'concurrent': job.concurrent,
+            'status': job.status,
+            'next_valid_time': next_time.strftime('%Y-%m-%d %H:%M:%S') if next_time else '',
+            'create_time': job.create_time.strftime('%Y-%m-%d %H:%M:%S') if job.create_time else '',
+            'run_count': stats.run_count if stats else 0,
+            'fail_count': stats.fail_count if stats else 0,
+            'avg_time': stats.total_time // stats.run_count if stats and stats.run_count else 0,
+            'max_time': stats.max_time if stats else 0,
+            'p50_time': stats.p50_time if stats else 0,
+            'p95_time': stats.p95_time if stats else 0,
+            'last_run_time': stats.last_run_time.strftime('%Y-%m-%d %H:%M:%S') if stats and stats.last_run_time else '',
+            'last_status': stats.last_status if stats else ''
+        }
+        rows.append(row)
+    
+    return table_response(rows, total)
+
+
+@monitor_bp.route('/jobLog/list/data')
+@login_required
+@permission_required('monitor:job:list')
+@versioned('sys_job_log')
+@read_only
+def job_log_list_data():
+    """定时任务日志列表数据(cursor参数启用游标分页)"""
+    page = request.args.get('pageNum', 1, type=int)
+    per_page = request.args.get('pageSize', 10, type=int)
+    job_name = request.args.get('jobName', '').strip()
+    job_group = request.args.get('jobGroup', '').strip()
+    status = request.args.get('status', '').strip()
+    
+    query = JobLog.query
+    if job_name:
+        query = query.filter(JobLog.job_name == job_name)
+    if job_group:
+        query = query.filter(JobLog.job_group == job_group)
+    if status:
+        query = query.filter(JobLog.status == status)
+    
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        # 游标分页: 按(create_time, job_log_id)定位，无过滤条件时总数取估算值
+        per_page = min(per_page, current_app.config['MAX_PAGE_SIZE'])
+        logs, next_cursor, prev_cursor = keyset_paginate(
+            query, [JobLog.create_time, JobLog.job_log_id], cursor, per_page
+        )
+        total = cursor_total(query, JobLog.job_log_id, request.args.get('withTotal') == 'true')
+        return table_response(job_log_rows(logs), total, nextCursor=next_cursor, prevCursor=prev_cursor)
+    
+    logs, total = paginate(query.order_by(JobLog.create_time.desc(), JobLog.job_log_id.desc()), page, per_page)
+    return table_response(job_log_rows(logs), total)
+
+
+def job_log_rows(logs):
+    """任务日志转换为表格行"""
+    rows = []
+    for log in logs:
+        row = {
+            'job_log_id': log.job_log_id,
+            'job_name': log.job_name,
+            'job_group': log.job_group,
+            'invoke_target': log.invoke_target,
+            'job_message': log.job_message,
+            'status': log.status,
+            'exception_info': log.exception_info,
+            'create_time': log.create_time.strftime('%Y-%m-%d %H:%M:%S') if log.create_time else ''
+        }
+        rows.append(row)
+    
+    return rows
+
+
 @monitor_bp.route('/operlog/list')
 @login_required
 @permission_required('monitor:operlog:view')
@@ -69,14 +205,30 @@ def operlog_list():
 @monitor_bp.route('/operlog/list/data')
 @login_required
 @permission_required('monitor:operlog:list')
+@versioned('sys_oper_log')
+@read_only
 def operlog_list_data():
     """操作日志列表数据"""
     page = request.args.get('pageNum', 1, type=int)
     per_page = request.args.get('pageSize', 10, type=int)
     
     query = OperLog.query
-    logs, total = paginate(query.order_by(OperLog.oper_time.desc()), page, per_page)
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        # 游标分页: 按(oper_time, oper_id)定位，无过滤条件时总数取估算值
+        per_page = min(per_page, current_app.config['MAX_PAGE_SIZE'])
+        logs, next_cursor, prev_cursor = keyset_paginate(
+            query, [OperLog.oper_time, OperLog.oper_id], cursor, per_page
+        )
+        total = cursor_total(query, OperLog.oper_id, request.args.get('withTotal') == 'true')
+        return table_response(operlog_rows(logs), total, nextCursor=next_cursor, prevCursor=prev_cursor)
     
+    logs, total = paginate(query.order_by(OperLog.oper_time.desc(), OperLog.oper_id.desc()), page, per_page)
+    return table_response(operlog_rows(logs), total)
+
+
+def operlog_rows(logs):
+    """操作日志转换为表格行"""
     rows = []
     for log in logs:
         row = {
@@ -90,11 +242,27 @@ def operlog_list_data():
             'oper_ip': log.oper_ip,
             'oper_location': log.oper_location,
             'status': log.status,
+            'cost_time': log.cost_time,
             'oper_time': log.oper_time.strftime('%Y-%m-%d %H:%M:%S') if log.oper_time else ''
         }
         rows.append(row)
     
-    return table_response(rows, total)
+    return rows
+
+
+@monitor_bp.route('/operlog/export', methods=['GET', 'POST'])
+@login_required
+@permission_required('monitor:operlog:export')
+def operlog_export():
+    """导出操作日志(format为xlsx或csv)"""
+    query = OperLog.query.with_entities(
+        OperLog.oper_id, OperLog.title, OperLog.business_type, OperLog.request_method, OperLog.oper_name,
+        OperLog.dept_name, OperLog.oper_url, OperLog.oper_ip, OperLog.oper_location, OperLog.status,
+        OperLog.cost_time, OperLog.oper_time
+    ).order_by(OperLog.oper_time.desc(), OperLog.oper_id.desc())
+    headers = ['操作序号', '操作模块', '业务类型', '请求方式', '操作人员', '部门名称', '请求地址',
+               '操作地址', '操作地点', '状态', '消耗时间(毫秒)', '操作时间']
+    return export_response('操作日志', headers, iter_rows(query), request.values.get('format', 'xlsx'))
 
 
 @monitor_bp.route('/logininfor/list')
@@ -108,14 +276,30 @@ def logininfor_list():
 @monitor_bp.route('/logininfor/list/data')
 @login_required
 @permission_required('monitor:logininfor:list')
+@versioned('sys_logininfor')
+@read_only
 def logininfor_list_data():
     """登录日志列表数据"""
     page = request.args.get('pageNum', 1, type=int)
     per_page = request.args.get('pageSize', 10, type=int)
     
     query = LoginInfo.query
-    logs, total = paginate(query.order_by(LoginInfo.login_time.desc()), page, per_page)
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        # 游标分页: 按(login_time, info_id)定位，无过滤条件时总数取估算值
+        per_page = min(per_page, current_app.config['MAX_PAGE_SIZE'])
+        logs, next_cursor, prev_cursor = keyset_paginate(
+            query, [LoginInfo.login_time, LoginInfo.info_id], cursor, per_page
+        )
+        total = cursor_total(query, LoginInfo.info_id, request.args.get('withTotal') == 'true')
+        return table_response(logininfor_rows(logs), total, nextCursor=next_cursor, prevCursor=prev_cursor)
     
+    logs, total = paginate(query.order_by(LoginInfo.login_time.desc(), LoginInfo.info_id.desc()), page, per_page)
+    return table_response(logininfor_rows(logs), total)
+
+
+def logininfor_rows(logs):
+    """登录日志转换为表格行"""
     rows = []
     for log in logs:
         row = {
@@ -131,7 +315,20 @@ def logininfor_list_data():
         }
         rows.append(row)
     
-    return table_response(rows, total)
+    return rows
+
+
+@monitor_bp.route('/logininfor/export', methods=['GET', 'POST'])
+@login_required
+@permission_required('monitor:logininfor:export')
+def logininfor_export():
+    """导出登录日志(format为xlsx或csv)"""
+    query = LoginInfo.query.with_entities(
+        LoginInfo.info_id, LoginInfo.login_name, LoginInfo.ipaddr, LoginInfo.login_location,
+        LoginInfo.browser, LoginInfo.os, LoginInfo.status, LoginInfo.msg, LoginInfo.login_time
+    ).order_by(LoginInfo.login_time.desc(), LoginInfo.info_id.desc())
+    headers = ['访问编号', '登录名称', '登录地址', '登录地点', '浏览器', '操作系统', '登录状态', '提示消息', '访问时间']
+    return export_response('登录日志', headers, iter_rows(query), request.values.get('format', 'xlsx'))
 
 
 @monitor_bp.route('/server')
@@ -142,52 +339,44 @@ def server():
     return render_template('monitor/server/server.html')
 
 
+@monitor_bp.route('/server/history')
+@login_required
+@permission_required('monitor:server:list')
+def server_history():
+    """
+    服务器指标历史(默认最近1小时)
+    参数: start/end 时间戳(秒), resolution raw/1m/1h/auto
+    """
+    end = request.args.get('end', time.time(), type=float)
+    start = request.args.get('start', end - 3600, type=float)
+    resolution = request.args.get('resolution', 'auto')
+    resolution, points = metrics_store.query(start, end, resolution)
+    return success_response(data={'resolution': resolution, 'points': points})
+
+
 @monitor_bp.route('/server/info')
 @login_required
 @permission_required('monitor:server:list')
 def server_info():
-    """获取服务器信息"""
+    """获取服务器信息(读取后台采样的最新快照，history=true时附带历史序列)"""
     try:
-        # CPU信息
-        cpu_count = psutil.cpu_count(logical=False)
-        cpu_count_logical = psutil.cpu_count(logical=True)
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # 内存信息
-        mem = psutil.virtual_memory()
-        mem_total = mem.total / (1024 ** 3)  # GB
-        mem_used = mem.used / (1024 ** 3)
-        mem_free = mem.free / (1024 ** 3)
-        mem_percent = mem.percent
-        
-        # 磁盘信息
-        disk = psutil.disk_usage('/')
-        disk_total = disk.total / (1024 ** 3)
-        disk_used = disk.used / (1024 ** 3)
-        disk_free = disk.free / (1024 ** 3)
-        disk_percent = disk.percent
-        
+        snapshot = server_sampler.latest()
         server_info = {
-            'cpu': {
-                'count': cpu_count,
-                'count_logical': cpu_count_logical,
-                'percent': cpu_percent
-            },
-            'memory': {
-                'total': round(mem_total, 2),
-                'used': round(mem_used, 2),
-                'free': round(mem_free, 2),
-                'percent': mem_percent
-            },
-            'disk': {
-                'total': round(disk_total, 2),
-                'used': round(disk_used, 2),
-                'free': round(disk_free, 2),
-                'percent': disk_percent
-            },
-            'python_version': psutil.python_version() if hasattr(psutil, 'python_version') else 'N/A',
-            'boot_time': datetime.fromtimestamp(psutil.boot_time()).strftime('%Y-%m-%d %H:%M:%S')
+            'cpu': snapshot['cpu'],
+            'memory': snapshot['memory'],
+            'disk': snapshot['disk'],
+            'network': snapshot['network'],
+            'process': snapshot['process'],
+            'sample_time': snapshot['time'],
+            'python_version': platform.python_version(),
+            'boot_time': datetime.fromtimestamp(psutil.boot_time()).strftime('%Y-%m-%d %H:%M:%S'),
+            'audit': audit_writer.stats(),
+            'cache': cache.stats(),
+            'latency': latency_stats.snapshot()
         }
+        if request.args.get('history') == 'true':
+            since = request.args.get('since', type=float)
+            server_info['history'] = server_sampler.series(since)
         
         return success_response(data=server_info)
     except Exception as e:
@@ -1,11 +1,17 @@
 """
 系统管理路由 - 用户、角色、菜单、部门等管理
 """
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required, current_user
-from app.models import db, User, Role, Menu, Dept, Post, DictType, DictData, Config, Notice
-from app.decorators import permission_required
-from app.utils import success_response, error_response, table_response, paginate, get_dict_list
+from app.models import db, User, Role, Menu, Dept, Post, DictType, DictData, Config, Notice, user_role, user_post, role_menu, role_dept
+from app.decorators import permission_required, versioned, read_only, oper_log, BUSINESS_OTHER, BUSINESS_INSERT, BUSINESS_UPDATE, BUSINESS_DELETE, BUSINESS_IMPORT
+from app.utils import success_response, error_response, table_response, paginate, get_dict_list, build_tree, allowed_file
+from app.dicts import label_rows, get_dict
+from app.export import export_response, iter_rows, read_rows, EXPORT_FORMATS
+from app.user_import import import_users, TEMPLATE_HEADERS
+from app.sysconfig import get_config, refresh_configs
+from app.search import contains
+from app.bulk import parse_ids, bulk_update, bulk_delete
 from datetime import datetime
 
 system_bp = Blueprint('system', __name__)
@@ -22,26 +28,13 @@ def user_list():
 @system_bp.route('/user/list/data')
 @login_required
 @permission_required('system:user:list')
+@versioned('sys_user', 'sys_dept', 'sys_dict_data')
+@read_only
 def user_list_data():
     """用户列表数据API"""
     page = request.args.get('pageNum', 1, type=int)
     per_page = request.args.get('pageSize', 10, type=int)
-    login_name = request.args.get('loginName', '').strip()
-    phonenumber = request.args.get('phonenumber', '').strip()
-    status = request.args.get('status', '').strip()
-    dept_id = request.args.get('deptId', type=int)
-    
-    query = User.query.filter_by(del_flag='0')
-    
-    if login_name:
-        query = query.filter(User.login_name.like(f'%{login_name}%'))
-    if phonenumber:
-        query = query.filter(User.phonenumber.like(f'%{phonenumber}%'))
-    if status:
-        query = query.filter_by(status=status)
-    if dept_id:
-        query = query.filter_by(dept_id=dept_id)
-    
+    query = user_query(request.args)
     users, total = paginate(query.order_by(User.create_time.desc()), page, per_page)
     
     # 转换为字典
@@ -60,9 +53,85 @@ def user_list_data():
         }
         rows.append(row)
     
+    label_rows(rows, {'sex': 'sys_user_sex', 'status': 'sys_normal_disable'})
     return table_response(rows, total)
 
 
+def user_query(args):
+    """按查询参数(登录名、手机号、状态、部门)过滤的用户查询，列表和导出共用"""
+    login_name = args.get('loginName', '').strip()
+    phonenumber = args.get('phonenumber', '').strip()
+    status = args.get('status', '').strip()
+    dept_id = args.get('deptId', type=int)
+    
+    query = User.query.filter_by(del_flag='0')
+    
+    if login_name:
+        query = query.filter(contains(User.login_name, login_name))
+    if phonenumber:
+        query = query.filter(contains(User.phonenumber, phonenumber))
+    if status:
+        query = query.filter_by(status=status)
+    if dept_id:
+        # 包含所选部门及其所有下级部门
+        dept = db.session.get(Dept, dept_id)
+        if dept:
+            sub_dept_ids = db.session.query(Dept.dept_id).filter(Dept.subtree_filter(dept.path))
+            query = query.filter(db.or_(User.dept_id == dept_id, User.dept_id.in_(sub_dept_ids)))
+        else:
+            query = query.filter_by(dept_id=dept_id)
+    return query
+
+
+@system_bp.route('/user/export', methods=['GET', 'POST'])
+@login_required
+@permission_required('system:user:export')
+def user_export():
+    """导出用户(查询条件同列表，format为xlsx或csv)"""
+    query = user_query(request.values).outerjoin(Dept, User.dept_id == Dept.dept_id).with_entities(
+        User.user_id, User.login_name, User.user_name, Dept.dept_name, User.email, User.phonenumber,
+        User.sex, User.status, User.create_time
+    ).order_by(User.create_time.desc(), User.user_id.desc())
+    sex_labels = get_dict('sys_user_sex').labels
+    status_labels = get_dict('sys_normal_disable').labels
+    rows = ((user_id, login_name, user_name, dept_name, email, phonenumber,
+             sex_labels.get(sex, sex), status_labels.get(status, status), create_time)
+            for user_id, login_name, user_name, dept_name, email, phonenumber, sex, status, create_time
+            in iter_rows(query))
+    headers = ['用户序号', '登录名称', '用户名称', '部门名称', '用户邮箱', '手机号码', '用户性别', '帐号状态', '创建时间']
+    return export_response('用户数据', headers, rows, request.values.get('format', 'xlsx'))
+
+
+@system_bp.route('/user/importData', methods=['POST'])
+@login_required
+@permission_required('system:user:import')
+@oper_log('用户管理', BUSINESS_IMPORT)
+def user_import_data():
+    """导入用户(CSV或XLSX，首行为表头，表头同导入模板)"""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return error_response('请选择要导入的文件')
+    if not allowed_file(file.filename, EXPORT_FORMATS):
+        return error_response('仅支持xlsx或csv格式的文件')
+    try:
+        report = import_users(read_rows(file.stream, file.filename), current_user.login_name,
+                              get_config('sys.user.initPassword', '123456'), current_app.config)
+    except ValueError as e:
+        return error_response(f'导入失败: {str(e)}')
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'导入失败: {str(e)}')
+    return success_response(f'导入完成: 成功{report.success}条，失败{report.failed}条', data=report.to_dict())
+
+
+@system_bp.route('/user/importTemplate')
+@login_required
+@permission_required('system:user:import')
+def user_import_template():
+    """下载用户导入模板"""
+    return export_response('用户导入模板', TEMPLATE_HEADERS, [], request.args.get('format', 'xlsx'))
+
+
 @system_bp.route('/role/list')
 @login_required
 @permission_required('system:role:view')
@@ -123,6 +192,7 @@ def notice_list():
 @system_bp.route('/user/add', methods=['POST'])
 @login_required
 @permission_required('system:user:add')
+@oper_log('用户管理', BUSINESS_INSERT)
 def user_add():
     """添加用户"""
     try:
@@ -138,7 +208,7 @@ def user_add():
             create_by=current_user.login_name,
             create_time=datetime.now()
         )
-        user.set_password(data.get('password', '123456'))
+        user.set_password(data.get('password') or get_config('sys.user.initPassword', '123456'))
         
         db.session.add(user)
         db.session.commit()
@@ -152,6 +222,7 @@ def user_add():
 @system_bp.route('/user/edit', methods=['POST'])
 @login_required
 @permission_required('system:user:edit')
+@oper_log('用户管理', BUSINESS_UPDATE)
 def user_edit():
     """编辑用户"""
     try:
@@ -178,18 +249,18 @@ def user_edit():
 @system_bp.route('/user/remove', methods=['POST'])
 @login_required
 @permission_required('system:user:remove')
+@oper_log('用户管理', BUSINESS_DELETE)
 def user_remove():
     """删除用户"""
     try:
-        user_ids = request.form.get('ids', '').split(',')
-        for user_id in user_ids:
-            if user_id:
-                user = User.query.get(int(user_id))
-                if user:
-                    user.del_flag = '2'
-        
+        user_ids = parse_ids(request.form.get('ids'))
+        if not user_ids:
+            return error_response('请选择要删除的用户')
+        count = bulk_update(User.user_id, user_ids, {'del_flag': '2'}, User.del_flag == '0')
+        bulk_delete(user_role.c.user_id, user_ids)
+        bulk_delete(user_post.c.user_id, user_ids)
         db.session.commit()
-        return success_response('删除成功')
+        return success_response('删除成功', data={'count': count})
     except Exception as e:
         db.session.rollback()
         return error_response(f'删除失败: {str(e)}')
@@ -198,6 +269,8 @@ def user_remove():
 # 岗位管理API
 @system_bp.route('/post/list/data')
 @login_required
+@versioned('sys_post')
+@read_only
 def post_list_data():
     """岗位列表数据"""
     page = request.args.get('pageNum', 1, type=int)
@@ -207,7 +280,7 @@ def post_list_data():
     
     query = Post.query
     if post_name:
-        query = query.filter(Post.post_name.like(f'%{post_name}%'))
+        query = query.filter(contains(Post.post_name, post_name))
     if status:
         query = query.filter_by(status=status)
     
@@ -229,6 +302,7 @@ def post_list_data():
 
 @system_bp.route('/post/add', methods=['POST'])
 @login_required
+@oper_log('岗位管理', BUSINESS_INSERT)
 def post_add():
     """新增岗位"""
     try:
@@ -251,6 +325,7 @@ def post_add():
 
 @system_bp.route('/post/edit', methods=['POST'])
 @login_required
+@oper_log('岗位管理', BUSINESS_UPDATE)
 def post_edit():
     """编辑岗位"""
     try:
@@ -274,15 +349,17 @@ def post_edit():
 
 @system_bp.route('/post/remove', methods=['POST'])
 @login_required
+@oper_log('岗位管理', BUSINESS_DELETE)
 def post_remove():
     """删除岗位"""
     try:
-        post_ids = request.form.get('ids', '').split(',')
-        for post_id in post_ids:
-            if post_id:
-                Post.query.filter_by(post_id=int(post_id)).delete()
+        post_ids = parse_ids(request.form.get('ids'))
+        if not post_ids:
+            return error_response('请选择要删除的岗位')
+        count = bulk_delete(Post.post_id, post_ids)
+        bulk_delete(user_post.c.post_id, post_ids)
         db.session.commit()
-        return success_response('删除成功')
+        return success_response('删除成功', data={'count': count})
     except Exception as e:
         db.session.rollback()
         return error_response(f'删除失败: {str(e)}')
@@ -291,37 +368,34 @@ def post_remove():
 # 部门管理API
 @system_bp.route('/dept/tree')
 @login_required
+@read_only
 def dept_tree():
     """部门树形数据"""
     depts = Dept.query.order_by(Dept.parent_id, Dept.order_num).all()
     
-    def build_tree(parent_id=0):
-        result = []
-        for dept in depts:
-            if dept.parent_id == parent_id:
-                node = {
-                    'dept_id': dept.dept_id,
-                    'dept_name': dept.dept_name,
-                    'parent_id': dept.parent_id,
-                    'order_num': dept.order_num,
-                    'status': dept.status,
-                    'create_time': dept.create_time.strftime('%Y-%m-%d %H:%M:%S') if dept.create_time else '',
-                    'children': build_tree(dept.dept_id)
-                }
-                result.append(node)
-        return result
+    nodes = [{
+        'dept_id': dept.dept_id,
+        'dept_name': dept.dept_name,
+        'parent_id': dept.parent_id,
+        'order_num': dept.order_num,
+        'status': dept.status,
+        'create_time': dept.create_time.strftime('%Y-%m-%d %H:%M:%S') if dept.create_time else ''
+    } for dept in depts]
     
-    tree_data = build_tree(0)
-    return success_response('查询成功', tree_data)
+    tree_data = build_tree(nodes, 0, id_field='dept_id', keep_empty=True)
+    return success_response('查询成功', data=tree_data)
 
 
 @system_bp.route('/dept/add', methods=['POST'])
 @login_required
+@oper_log('部门管理', BUSINESS_INSERT)
 def dept_add():
     """新增部门"""
     try:
+        parent_id = request.form.get('parentId', 0, type=int)
         dept = Dept(
-            parent_id=request.form.get('parentId', 0, type=int),
+            parent_id=parent_id,
+            ancestors=get_dept_ancestors(parent_id),
             dept_name=request.form.get('deptName'),
             order_num=request.form.get('orderNum', 0, type=int),
             leader=request.form.get('leader', ''),
@@ -341,13 +415,22 @@ def dept_add():
 
 @system_bp.route('/dept/edit', methods=['POST'])
 @login_required
+@oper_log('部门管理', BUSINESS_UPDATE)
 def dept_edit():
     """编辑部门"""
     try:
         dept_id = request.form.get('deptId', type=int)
         dept = Dept.query.get_or_404(dept_id)
         
-        dept.parent_id = request.form.get('parentId', type=int)
+        parent_id = request.form.get('parentId', dept.parent_id, type=int)
+        if parent_id != dept.parent_id:
+            new_ancestors = get_dept_ancestors(parent_id)
+            if str(dept_id) in new_ancestors.split(','):
+                return error_response('上级部门不能是自己或下级部门')
+            move_dept_subtree(dept, new_ancestors)
+            dept.parent_id = parent_id
+            dept.ancestors = new_ancestors
+        
         dept.dept_name = request.form.get('deptName')
         dept.order_num = request.form.get('orderNum', type=int)
         dept.leader = request.form.get('leader', '')
@@ -364,8 +447,27 @@ def dept_edit():
         return error_response(f'修改失败: {str(e)}')
 
 
+def get_dept_ancestors(parent_id):
+    """根据上级部门计算祖级列表"""
+    parent = db.session.get(Dept, parent_id) if parent_id else None
+    if not parent:
+        return '0'
+    return parent.path
+
+
+def move_dept_subtree(dept, new_ancestors):
+    """部门变更上级时，用一条UPDATE语句重写整个下级子树的祖级列表"""
+    old_path = dept.path
+    new_path = f'{new_ancestors},{dept.dept_id}'
+    Dept.query.filter(Dept.subtree_filter(old_path)).update(
+        {Dept.ancestors: db.literal(new_path) + db.func.substr(Dept.ancestors, len(old_path) + 1)},
+        synchronize_session=False
+    )
+
+
 @system_bp.route('/dept/remove/<int:dept_id>', methods=['POST'])
 @login_required
+@oper_log('部门管理', BUSINESS_DELETE)
 def dept_remove(dept_id):
     """删除部门"""
     try:
@@ -388,6 +490,8 @@ def dept_remove(dept_id):
 # 角色管理API
 @system_bp.route('/role/list/data')
 @login_required
+@versioned('sys_role')
+@read_only
 def role_list_data():
     """角色列表数据"""
     page = request.args.get('pageNum', 1, type=int)
@@ -398,9 +502,9 @@ def role_list_data():
     
     query = Role.query.filter_by(del_flag='0')
     if role_name:
-        query = query.filter(Role.role_name.like(f'%{role_name}%'))
+        query = query.filter(contains(Role.role_name, role_name))
     if role_key:
-        query = query.filter(Role.role_key.like(f'%{role_key}%'))
+        query = query.filter(contains(Role.role_key, role_key))
     if status:
         query = query.filter_by(status=status)
     
@@ -422,6 +526,7 @@ def role_list_data():
 
 @system_bp.route('/role/add', methods=['POST'])
 @login_required
+@oper_log('角色管理', BUSINESS_INSERT)
 def role_add():
     """新增角色"""
     try:
@@ -444,6 +549,7 @@ def role_add():
 
 @system_bp.route('/role/edit', methods=['POST'])
 @login_required
+@oper_log('角色管理', BUSINESS_UPDATE)
 def role_edit():
     """编辑角色"""
     try:
@@ -467,17 +573,20 @@ def role_edit():
 
 @system_bp.route('/role/remove', methods=['POST'])
 @login_required
+@oper_log('角色管理', BUSINESS_DELETE)
 def role_remove():
     """删除角色"""
     try:
-        role_ids = request.form.get('ids', '').split(',')
-        for role_id in role_ids:
-            if role_id:
-                role = Role.query.get(int(role_id))
-                if role:
-                    role.del_flag = '2'
+        role_ids = parse_ids(request.form.get('ids'))
+        if not role_ids:
+            return error_response('请选择要删除的角色')
+        count = bulk_update(Role.role_id, role_ids, {'del_flag': '2'}, Role.del_flag == '0')
+        # 删除的角色不再授予菜单权限
+        bulk_delete(role_menu.c.role_id, role_ids)
+        bulk_delete(role_dept.c.role_id, role_ids)
+        bulk_delete(user_role.c.role_id, role_ids)
         db.session.commit()
-        return success_response('删除成功')
+        return success_response('删除成功', data={'count': count})
     except Exception as e:
         db.session.rollback()
         return error_response(f'删除失败: {str(e)}')
@@ -486,36 +595,30 @@ def role_remove():
 # 菜单管理API
 @system_bp.route('/menu/tree')
 @login_required
+@read_only
 def menu_tree():
     """菜单树形数据"""
     menus = Menu.query.order_by(Menu.parent_id, Menu.order_num).all()
     
-    def build_tree(parent_id=0):
-        result = []
-        for menu in menus:
-            if menu.parent_id == parent_id:
-                node = {
-                    'menu_id': menu.menu_id,
-                    'menu_name': menu.menu_name,
-                    'parent_id': menu.parent_id,
-                    'order_num': menu.order_num,
-                    'url': menu.url,
-                    'menu_type': menu.menu_type,
-                    'visible': menu.visible,
-                    'status': menu.status,
-                    'perms': menu.perms,
-                    'icon': menu.icon,
-                    'children': build_tree(menu.menu_id)
-                }
-                result.append(node)
-        return result
+    nodes = [{
+        'menu_id': menu.menu_id,
+        'menu_name': menu.menu_name,
+        'parent_id': menu.parent_id,
+        'order_num': menu.order_num,
+        'url': menu.url,
+        'menu_type': menu.menu_type,
+        'visible': menu.visible,
+        'perms': menu.perms,
+        'icon': menu.icon
+    } for menu in menus]
     
-    tree_data = build_tree(0)
-    return success_response('查询成功', tree_data)
+    tree_data = build_tree(nodes, 0, id_field='menu_id', keep_empty=True)
+    return success_response('查询成功', data=tree_data)
 
 
 @system_bp.route('/menu/add', methods=['POST'])
 @login_required
+@oper_log('菜单管理', BUSINESS_INSERT)
 def menu_add():
     """新增菜单"""
     try:
@@ -542,6 +645,7 @@ def menu_add():
 
 @system_bp.route('/menu/edit', methods=['POST'])
 @login_required
+@oper_log('菜单管理', BUSINESS_UPDATE)
 def menu_edit():
     """编辑菜单"""
     try:
@@ -569,6 +673,7 @@ def menu_edit():
 
 @system_bp.route('/menu/remove/<int:menu_id>', methods=['POST'])
 @login_required
+@oper_log('菜单管理', BUSINESS_DELETE)
 def menu_remove(menu_id):
     """删除菜单"""
     try:
@@ -582,3 +687,134 @@ def menu_remove(menu_id):
     except Exception as e:
         db.session.rollback()
         return error_response(f'删除失败: {str(e)}')
+
+
+# 参数配置API
+@system_bp.route('/config/list/data')
+@login_required
+@permission_required('system:config:list')
+@versioned('sys_config')
+@read_only
+def config_list_data():
+    """参数配置列表数据"""
+    page = request.args.get('pageNum', 1, type=int)
+    per_page = request.args.get('pageSize', 10, type=int)
+    config_name = request.args.get('configName', '').strip()
+    config_key = request.args.get('configKey', '').strip()
+    config_type = request.args.get('configType', '').strip()
+    
+    query = Config.query
+    if config_name:
+        query = query.filter(Config.config_name.like(f'%{config_name}%'))
+    if config_key:
+        query = query.filter(Config.config_key.like(f'%{config_key}%'))
+    if config_type:
+        query = query.filter_by(config_type=config_type)
+    
+    configs, total = paginate(query.order_by(Config.config_id), page, per_page)
+    
+    rows = []
+    for config in configs:
+        rows.append({
+            'config_id': config.config_id,
+            'config_name': config.config_name,
+            'config_key': config.config_key,
+            'config_value': config.config_value,
+            'config_type': config.config_type,
+            'remark': config.remark,
+            'create_time': config.create_time.strftime('%Y-%m-%d %H:%M:%S') if config.create_time else ''
+        })
+    
+    return table_response(rows, total)
+
+
+@system_bp.route('/config/configKey/<path:config_key>')
+@login_required
+@permission_required('system:config:query')
+def config_value(config_key):
+    """根据参数键名查询参数值(读取内存快照)"""
+    return success_response('查询成功', data=get_config(config_key, ''))
+
+
+@system_bp.route('/config/add', methods=['POST'])
+@login_required
+@permission_required('system:config:add')
+@oper_log('参数管理', BUSINESS_INSERT)
+def config_add():
+    """新增参数"""
+    try:
+        config_key = request.form.get('configKey', '').strip()
+        if Config.query.filter_by(config_key=config_key).first():
+            return error_response(f"新增参数'{config_key}'失败，参数键名已存在")
+        config = Config(
+            config_name=request.form.get('configName'),
+            config_key=config_key,
+            config_value=request.form.get('configValue'),
+            config_type=request.form.get('configType', 'N'),
+            remark=request.form.get('remark', ''),
+            create_by=current_user.login_name,
+            create_time=datetime.now()
+        )
+        db.session.add(config)
+        db.session.commit()
+        return success_response('新增成功')
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'新增失败: {str(e)}')
+
+
+@system_bp.route('/config/edit', methods=['POST'])
+@login_required
+@permission_required('system:config:edit')
+@oper_log('参数管理', BUSINESS_UPDATE)
+def config_edit():
+    """编辑参数"""
+    try:
+        config_id = request.form.get('configId', type=int)
+        config = Config.query.get_or_404(config_id)
+        
+        config_key = request.form.get('configKey', '').strip()
+        if Config.query.filter(Config.config_key == config_key, Config.config_id != config_id).first():
+            return error_response(f"修改参数'{config_key}'失败，参数键名已存在")
+        config.config_name = request.form.get('configName')
+        config.config_key = config_key
+        config.config_value = request.form.get('configValue')
+        config.config_type = request.form.get('configType', config.config_type)
+        config.remark = request.form.get('remark', '')
+        config.update_by = current_user.login_name
+        config.update_time = datetime.now()
+        
+        db.session.commit()
+        return success_response('修改成功')
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'修改失败: {str(e)}')
+
+
+@system_bp.route('/config/remove', methods=['POST'])
+@login_required
+@permission_required('system:config:remove')
+@oper_log('参数管理', BUSINESS_DELETE)
+def config_remove():
+    """删除参数(系统内置参数不能删除)"""
+    try:
+        config_ids = [int(i) for i in request.form.get('ids', '').split(',') if i]
+        builtin = Config.query.filter(Config.config_id.in_(config_ids), Config.config_type == 'Y').first()
+        if builtin:
+            return error_response(f'内置参数【{builtin.config_key}】不能删除')
+        Config.query.filter(Config.config_id.in_(config_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        return success_response('删除成功')
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'删除失败: {str(e)}')
+
+
+@system_bp.route('/config/refreshCache', methods=['POST'])
+@login_required
+@permission_required('system:config:remove')
+@oper_log('参数管理', BUSINESS_OTHER)
+def config_refresh_cache():
+    """刷新参数缓存"""
+    refresh_configs()
+    return success_response('刷新成功')
@@ -0,0 +1,420 @@
+"""
+定时任务调度 - 执行sys_job中定义的任务
+下次触发时间保存在最小堆中(调度开销O(log n))，任务在有界线程池中执行，
+执行日志通过审计写入器批量写入sys_job_log
+"""
+import re
+import ast
+import heapq
+import time
+import logging
+import importlib
+import itertools
+import threading
+import traceback
+from datetime import datetime, timedelta
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from apscheduler.triggers.cron import CronTrigger
+from tzlocal import get_localzone
+from sqlalchemy import select, func
+from app.models import db, Job, JobLog, JobLease, JobStats
+from app.audit import audit_writer
+from app.job_lease import lease_manager
+from app.job_stats import update_job_stats
+from app import versions
+
+logger = logging.getLogger(__name__)
+
+# 计划执行错误策略
+MISFIRE_IGNORE = '1'   # 立即执行(补执行所有错过的触发)
+MISFIRE_FIRE_ONCE = '2'  # 执行一次
+MISFIRE_NOTHING = '3'  # 放弃执行
+
+# 星期数字转换为名称(APScheduler的数字含义为0=周一，与cron不同)
+_QUARTZ_WEEKDAYS = {'1': 'sun', '2': 'mon', '3': 'tue', '4': 'wed', '5': 'thu', '6': 'fri', '7': 'sat'}
+_CRONTAB_WEEKDAYS = {'0': 'sun', '1': 'mon', '2': 'tue', '3': 'wed', '4': 'thu', '5': 'fri', '6': 'sat', '7': 'sun'}
+
+
+class CronError(ValueError):
+    """cron表达式错误"""
+
+
+def _convert_weekday(field, names):
+    """将星期字段中的数字替换为名称(步长部分保持数字)"""
+    parts = []
+    for item in field.split(','):
+        base, sep, step = item.partition('/')
+        base = re.sub(r'\d', lambda m: names.get(m.group(), m.group()), base)
+        parts.append(base + sep + step)
+    return ','.join(parts)
+
+
+def parse_cron(expression, timezone=None):
+    """
+    解析cron表达式为触发器
+    支持Quartz格式(秒 分 时 日 月 周 [年]，如 0/10 * * * * ?)和标准5段格式(分 时 日 月 周)
+    """
+    fields = (expression or '').split()
+    if len(fields) == 5:
+        names = _CRONTAB_WEEKDAYS
+        fields = ['0'] + fields
+    elif len(fields) in (6, 7):
+        names = _QUARTZ_WEEKDAYS
+    else:
+        raise CronError(f'cron表达式格式错误: {expression}')
+    second, minute, hour, day, month, day_of_week = fields[:6]
+    year = fields[6] if len(fields) == 7 else None
+    if day == '?':
+        day = '*'
+    if day_of_week == '?':
+        day_of_week = '*'
+    day_of_week = _convert_weekday(day_of_week, names)
+    try:
+        return CronTrigger(second=second, minute=minute, hour=hour, day=day, month=month,
+                           day_of_week=day_of_week, year=year, timezone=timezone or get_localzone())
+    except ValueError as e:
+        raise CronError(f'cron表达式格式错误: {expression} ({e})')
+
+
+# 调用目标
+
+def resolve_target(invoke_target, allowed_prefixes):
+    """
+    解析调用目标字符串，如 app.tasks.params('ry', 1)
+    只允许调用allowed_prefixes中模块下的函数，参数须为字面量
+    :return: (函数, 位置参数, 关键字参数)
+    """
+    try:
+        node = ast.parse(invoke_target.strip(), mode='eval').body
+    except SyntaxError:
+        raise ValueError(f'调用目标格式错误: {invoke_target}')
+    if isinstance(node, ast.Call):
+        func_node, args, kwargs = node.func, [ast.literal_eval(a) for a in node.args], \
+            {k.arg: ast.literal_eval(k.value) for k in node.keywords}
+    else:
+        func_node, args, kwargs = node, [], {}
+    path = ast.unparse(func_node)
+    if not any(path == p or path.startswith(p + '.') for p in allowed_prefixes):
+        raise ValueError(f'调用目标不在白名单内: {path}')
+    module_name, _, func_name = path.rpartition('.')
+    func = getattr(importlib.import_module(module_name), func_name)
+    return func, args, kwargs
+
+
+class ScheduledJob:
+    """调度中的任务(sys_job行的快照)"""
+
+    __slots__ = ('job_id', 'job_name', 'job_group', 'invoke_target', 'cron_expression',
+                 'misfire_policy', 'concurrent', 'trigger', 'generation', 'next_fire_time')
+
+    def __init__(self, job, trigger, generation):
+        self.job_id = job.job_id
+        self.job_name = job.job_name
+        self.job_group = job.job_group
+        self.invoke_target = job.invoke_target
+        self.cron_expression = job.cron_expression
+        self.misfire_policy = job.misfire_policy or MISFIRE_NOTHING
+        self.concurrent = job.concurrent or '1'
+        self.trigger = trigger
+        self.generation = generation
+        self.next_fire_time = None
+
+
+class JobScheduler:
+    """基于最小堆的cron调度器"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.pool_size = 10
+        self.misfire_grace = 1.0
+        self.allowed_targets = ('app.tasks',)
+        self.timezone = None
+        self._jobs = {}  # job_id -> ScheduledJob
+        self._executing = {}  # job_id -> 正在执行的次数
+        self._heap = []  # (触发时间戳, 序号, job_id, generation)
+        self._seq = itertools.count()
+        self._generation = itertools.count(1)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._stopping = False
+        self._reload_pending = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.pool_size = app.config.get('SCHEDULER_POOL_SIZE', 10)
+        self.misfire_grace = app.config.get('SCHEDULER_MISFIRE_GRACE', 1.0)
+        self.allowed_targets = tuple(app.config.get('SCHEDULER_ALLOWED_TARGETS', ('app.tasks',)))
+        app.extensions['job_scheduler'] = self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """加载任务并启动调度线程，停机期间错过的触发按各任务的计划执行错误策略处理"""
+        if self.running:
+            return
+        self.timezone = get_localzone()
+        self._stopping = False
+        self._get_executor()
+        versions.add_listener(self._on_tables_changed)
+        lease_manager.start(self._on_lease_takeover)
+        self.reload(self._last_fire_times())
+        self._thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+        self._thread.start()
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        lease_manager.stop()
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _get_executor(self):
+        """任务线程池，未启动调度(如SCHEDULER_ENABLED关闭)时在首次立即执行时创建"""
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='job')
+            return self._executor
+
+    # 任务管理
+
+    def reload(self, last_fire_times=None):
+        """
+        从数据库重新加载所有正常状态的任务
+        :param last_fire_times: 启动时传入各任务上次的触发时间，从其后计算触发以发现停机期间错过的触发
+        """
+        with self.app.app_context():
+            jobs = Job.query.filter_by(status='0').all()
+            loaded = {job.job_id: job for job in jobs}
+        with self._cond:
+            for job_id in list(self._jobs):
+                if job_id not in loaded:
+                    self._remove(job_id)
+            for job in loaded.values():
+                current = self._jobs.get(job.job_id)
+                if current is not None and self._same(current, job):
+                    continue
+                self._add(job, (last_fire_times or {}).get(job.job_id))
+            self._cond.notify()
+
+    def _last_fire_times(self):
+        """
+        各任务最近一次的计划触发时间: 取执行租约中的最大触发时间，
+        没有租约(未启用或已清理)时取执行统计中的最后执行时间
+        """
+        try:
+            with self.app.app_context():
+                last = dict(db.session.execute(select(JobStats.job_id, JobStats.last_run_time)).all())
+                last.update(db.session.execute(
+                    select(JobLease.job_id, func.max(JobLease.fire_time)).group_by(JobLease.job_id)).all())
+                db.session.remove()
+        except Exception:
+            logger.exception('读取任务上次触发时间失败，错过的触发不再补执行')
+            return {}
+        # 数据库中为本地时间
+        return {job_id: datetime.fromtimestamp(value.timestamp(), self.timezone)
+                for job_id, value in last.items() if value is not None}
+
+    def _same(self, scheduled, job):
+        """任务定义是否未变化"""
+        return (scheduled.invoke_target == job.invoke_target
+                and scheduled.cron_expression == job.cron_expression
+                and scheduled.misfire_policy == (job.misfire_policy or MISFIRE_NOTHING)
+                and scheduled.concurrent == (job.concurrent or '1')
+                and scheduled.job_name == job.job_name
+                and scheduled.job_group == job.job_group)
+
+    def _add(self, job, last_fire_time=None):
+        """加入/替换任务(调用方持有锁)"""
+        try:
+            trigger = parse_cron(job.cron_expression, self.timezone)
+        except CronError:
+            logger.exception('任务 %s 的cron表达式无效', job.job_id)
+            self._remove(job.job_id)
+            return
+        scheduled = ScheduledJob(job, trigger, next(self._generation))
+        self._jobs[job.job_id] = scheduled
+        now = datetime.now(self.timezone)
+        if last_fire_time is not None and scheduled.misfire_policy in (MISFIRE_IGNORE, MISFIRE_FIRE_ONCE):
+            missed = trigger.get_next_fire_time(last_fire_time, last_fire_time)
+            if missed is not None and missed < now:
+                # 停机期间错过的第一次触发入堆，调度循环按错误策略补执行全部或一次
+                self._push(scheduled, missed)
+                return
+        self._schedule(scheduled, None, now)
+
+    def _remove(self, job_id):
+        """移除任务，堆中的旧条目在弹出时按generation丢弃(调用方持有锁)"""
+        self._jobs.pop(job_id, None)
+
+    def _schedule(self, scheduled, previous, now):
+        """计算下次触发时间并入堆(调用方持有锁)"""
+        self._push(scheduled, scheduled.trigger.get_next_fire_time(previous, now))
+
+    def _push(self, scheduled, fire_time):
+        """触发时间入堆(调用方持有锁)"""
+        scheduled.next_fire_time = fire_time
+        if fire_time is not None:
+            heapq.heappush(self._heap, (fire_time.timestamp(), next(self._seq),
+                                        scheduled.job_id, scheduled.generation))
+
+    def _on_tables_changed(self, tables):
+        if 'sys_job' in tables:
+            with self._cond:
+                self._reload_pending = True
+                self._cond.notify()
+
+    def run_once(self, job_id):
+        """立即执行一次任务(不影响调度)"""
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            if job is None:
+                return False
+            scheduled = ScheduledJob(job, None, 0)
+        with self._cond:
+            self._executing[job_id] = self._executing.get(job_id, 0) + 1
+        try:
+            self._get_executor().submit(self._execute, scheduled)
+        except RuntimeError:
+            self._finished(job_id)  # 线程池正在关闭
+            return False
+        return True
+
+    # 调度循环
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                if self._reload_pending:
+                    self._reload_pending = False
+                    reload = True
+                else:
+                    reload = False
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    if timeout is None or timeout > 0:
+                        self._cond.wait(timeout)
+                        continue
+                    due = self._pop_due()
+            if reload:
+                try:
+                    self.reload()
+                except Exception:
+                    logger.exception('重新加载任务失败')
+                continue
+            for scheduled, fire_time in due:
+                self._fire(scheduled, fire_time)
+
+    def _pop_due(self):
+        """弹出所有已到期的任务(调用方持有锁)"""
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_ts, _, job_id, generation = heapq.heappop(self._heap)
+            scheduled = self._jobs.get(job_id)
+            if scheduled is None or scheduled.generation != generation:
+                continue  # 任务已删除或已更新
+            fire_time = datetime.fromtimestamp(fire_ts, self.timezone)
+            now_dt = datetime.fromtimestamp(now, self.timezone)
+            misfired = now - fire_ts > self.misfire_grace
+            if misfired and scheduled.misfire_policy == MISFIRE_IGNORE:
+                # 按原计划时间推进，后续错过的触发会依次补执行
+                self._schedule(scheduled, fire_time, fire_time)
+            elif misfired:
+                # 执行一次/放弃执行: 跳过当前时间之前错过的其余触发
+                self._schedule(scheduled, now_dt, now_dt)
+            else:
+                self._schedule(scheduled, fire_time, now_dt)
+            if misfired and scheduled.misfire_policy == MISFIRE_NOTHING:
+                continue
+            if scheduled.concurrent == '1' and self._executing.get(job_id):
+                continue  # 禁止并发: 上次执行未结束，跳过本次触发
+            self._executing[job_id] = self._executing.get(job_id, 0) + 1
+            due.append((scheduled, fire_time))
+        return due
+
+    def _on_lease_takeover(self, job_id, fire_time):
+        """其他进程执行中途退出，由本进程重新执行该次触发"""
+        with self._cond:
+            scheduled = self._jobs.get(job_id)
+            if scheduled is None:
+                lease_manager.complete(job_id, fire_time)
+                return
+            self._executing[job_id] = self._executing.get(job_id, 0) + 1
+        self._fire(scheduled, fire_time, claimed=True)
+
+    def _fire(self, scheduled, fire_time, claimed=False):
+        executor = self._executor
+        if executor is None:
+            self._finished(scheduled.job_id)  # 调度已停止
+            return
+        try:
+            executor.submit(self._execute, scheduled, fire_time, claimed)
+        except RuntimeError:
+            self._finished(scheduled.job_id)  # 线程池已关闭
+
+    def _execute(self, scheduled, fire_time=None, claimed=False):
+        """在线程池中执行任务并记录日志，计划触发须先认领租约"""
+        lease_time = fire_time.replace(tzinfo=None) if fire_time is not None else None
+        if lease_time is not None and not claimed:
+            try:
+                acquired = lease_manager.claim(scheduled.job_id, lease_time, exclusive=scheduled.concurrent == '1')
+            except Exception:
+                logger.exception('认领任务租约失败')
+                acquired = False
+            if not acquired:
+                self._finished(scheduled.job_id)
+                return  # 已由其他进程执行
+        start = time.perf_counter()
+        status = '0'
+        exception_info = ''
+        try:
+            func, args, kwargs = resolve_target(scheduled.invoke_target, self.allowed_targets)
+            with self.app.app_context():
+                func(*args, **kwargs)
+        except Exception:
+            status = '1'
+            exception_info = traceback.format_exc()[-2000:]
+        finally:
+            self._finished(scheduled.job_id)
+            if lease_time is not None:
+                try:
+                    lease_manager.complete(scheduled.job_id, lease_time)
+                except Exception:
+                    logger.exception('释放任务租约失败')
+        elapsed_ms = int((time.perf_counter() - start) * 1000)
+        audit_writer.add(
+            JobLog,
+            job_name=scheduled.job_name,
+            job_group=scheduled.job_group,
+            invoke_target=scheduled.invoke_target,
+            job_message=f'{scheduled.job_name} 总共耗时：{elapsed_ms}毫秒',
+            status=status,
+            exception_info=exception_info,
+            create_time=datetime.now()
+        )
+        audit_writer.call(partial(update_job_stats, scheduled.job_id, elapsed_ms, status, datetime.now()))
+
+    def _finished(self, job_id):
+        with self._cond:
+            count = self._executing.get(job_id, 0) - 1
+            if count > 0:
+                self._executing[job_id] = count
+            else:
+                self._executing.pop(job_id, None)
+
+    def next_fire_time(self, job_id):
+        scheduled = self._jobs.get(job_id)
+        return scheduled.next_fire_time if scheduled else None
+
+
+job_scheduler = JobScheduler()
@@ -0,0 +1,147 @@
+"""
+子串搜索 - 为用户、角色、岗位的搜索字段建立SQLite FTS5 trigram索引(外部内容表)，
+由触发器随增删改同步；搜索词不少于3个字符时用索引查出主键，避免 LIKE '%x%' 全表扫描，
+其他情况(搜索词过短、非SQLite、SQLite不支持trigram)退回LIKE；
+启动时对这几张表做抽样ANALYZE，否则无统计信息时SQLite会误选 (del_flag, create_time) 索引逐行匹配
+"""
+import sqlite3
+from sqlalchemy import DDL, event, select, literal_column, column, table
+from app.models import db, User, Role, Post
+
+# 表名 -> (主键列, 搜索列)
+SEARCH_INDEXES = {
+    'sys_user': ('user_id', ('login_name', 'phonenumber')),
+    'sys_role': ('role_id', ('role_name', 'role_key')),
+    'sys_post': ('post_id', ('post_name',)),
+}
+
+# trigram分词器需要SQLite 3.34+，少于3个字符的搜索词无法使用索引
+TRIGRAM_MIN_VERSION = (3, 34, 0)
+MIN_TERM_LENGTH = 3
+
+_MODELS = {'sys_user': User, 'sys_role': Role, 'sys_post': Post}
+_registered = False
+
+
+def fts_name(table_name):
+    return table_name + '_fts'
+
+
+def trigram_supported(dialect):
+    return dialect.name == 'sqlite' and sqlite3.sqlite_version_info >= TRIGRAM_MIN_VERSION
+
+
+def search_ddl(table_name):
+    """全文索引表和同步触发器的建表语句"""
+    pk, columns = SEARCH_INDEXES[table_name]
+    fts = fts_name(table_name)
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    insert_new = f'INSERT INTO {fts}(rowid, {names}) VALUES (new.{pk}, {new_values});'
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.{pk}, {old_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table_name}', "
+        f"content_rowid='{pk}', tokenize='trigram')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table_name} '
+        f'BEGIN {delete_old} {insert_new} END',
+    ]
+
+
+def _create_on_sqlite(ddl, target, bind, **kw):
+    return trigram_supported(bind.dialect)
+
+
+def register_search_ddl():
+    """
+    db.create_all()建表后同时建立全文索引并从原表重建内容；db.drop_all()删表前先删除全文索引，
+    否则重新建表后旧索引仍在，其中的rowid已对应其他行(只注册一次)
+    """
+    global _registered
+    if _registered:
+        return
+    for table_name in SEARCH_INDEXES:
+        model_table = _MODELS[table_name].__table__
+        fts = fts_name(table_name)
+        for statement in search_ddl(table_name) + [f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"]:
+            event.listen(model_table, 'after_create', DDL(statement).execute_if(callable_=_create_on_sqlite))
+        event.listen(model_table, 'before_drop',
+                     DDL(f'DROP TABLE IF EXISTS {fts}').execute_if(callable_=_create_on_sqlite))
+    _registered = True
+
+
+def ensure_search_indexes(engine):
+    """
+    为已有数据库补建全文索引并从原表重建索引内容
+    :return: 新建索引的表名列表
+    """
+    if not trigram_supported(engine.dialect):
+        return []
+    created = []
+    with engine.begin() as conn:
+        existing = {row[0] for row in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+        for table_name in SEARCH_INDEXES:
+            if table_name not in existing:
+                continue
+            fts = fts_name(table_name)
+            missing_triggers = {f'{fts}_ai', f'{fts}_ad', f'{fts}_au'} - existing
+            if fts in existing and not missing_triggers:
+                continue
+            for statement in search_ddl(table_name):
+                conn.exec_driver_sql(statement)
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            created.append(table_name)
+    return created
+
+
+def analyze_search_tables(engine, analysis_limit=1000):
+    """抽样收集搜索表的统计信息，使查询计划按全文索引查出的主键回表"""
+    if not trigram_supported(engine.dialect):
+        return
+    with engine.begin() as conn:
+        existing = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.exec_driver_sql(f'PRAGMA analysis_limit={int(analysis_limit)}')
+        for table_name in SEARCH_INDEXES:
+            if table_name in existing:
+                conn.exec_driver_sql(f'ANALYZE {table_name}')
+
+
+def _escape(term):
+    """FTS5查询串: 双引号包裹为短语，按原文匹配"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def match_rowids(table_name, column_name, term):
+    """全文索引中指定列包含term的主键查询"""
+    fts = fts_name(table_name)
+    return select(column('rowid')).select_from(table(fts)).where(
+        literal_column(fts).op('MATCH')(f'{column_name} : {_escape(term)}'))
+
+
+def contains(attribute, term):
+    """
+    子串匹配条件，用法 query.filter(contains(User.login_name, login_name))
+    可用全文索引时返回 主键 IN (SELECT rowid FROM 索引表 WHERE MATCH)，否则返回LIKE
+    """
+    table_name = attribute.class_.__tablename__
+    if (table_name not in SEARCH_INDEXES or len(term) < MIN_TERM_LENGTH
+            or not trigram_supported(db.engine.dialect)):
+        return attribute.like(f'%{term}%')
+    pk, columns = SEARCH_INDEXES[table_name]
+    if attribute.key not in columns:
+        return attribute.like(f'%{term}%')
+    return getattr(attribute.class_, pk).in_(match_rowids(table_name, attribute.key, term))
+
+
+def init_search(app):
+    """注册建表事件，为已有数据库补建全文索引并更新统计信息"""
+    register_search_ddl()
+    with app.app_context():
+        created = ensure_search_indexes(db.engine)
+        if app.config.get('SEARCH_ANALYZE_ON_START', True):
+            analyze_search_tables(db.engine, app.config.get('SEARCH_ANALYSIS_LIMIT', 1000))
+    if created:
+        app.logger.info('已建立全文索引: %s', ', '.join(created))
@@ -0,0 +1,44 @@
+"""
+参数配置 - sys_config全表加载为只读快照，读取参数为字典查找；
+快照经两级缓存按sys_config版本号校验，表数据变更后整体重新加载，
+其他进程由缓存失效通知同步(未配置共享缓存时最迟在CACHE_LOCAL_TTL秒后重新加载)
+"""
+from types import MappingProxyType
+from sqlalchemy import inspect
+from app.models import db, Config
+from app.cache import cache
+from app import versions
+
+CONFIG_TABLES = ('sys_config',)
+CACHE_KEY = 'config:all'
+
+
+def load_configs():
+    """一次查询加载全部参数，返回 参数键名->参数值 的字典(可pickle，供共享缓存)"""
+    rows = Config.query.with_entities(Config.config_key, Config.config_value).all()
+    return {key: value for key, value in rows}
+
+
+def get_snapshot():
+    """获取当前参数快照(只读映射)"""
+    return MappingProxyType(cache.get_or_load(CACHE_KEY, load_configs, CONFIG_TABLES))
+
+
+def get_config(key, default=None):
+    """根据参数键名获取参数值"""
+    return get_snapshot().get(key, default)
+
+
+def refresh_configs():
+    """
+    刷新参数缓存: 递增版本号，本进程下次读取时重新加载；
+    配置共享缓存时同时通知其他进程，否则其他进程在本地缓存过期(CACHE_LOCAL_TTL)后重新加载
+    """
+    versions.bump(*CONFIG_TABLES)
+
+
+def init_configs(app):
+    """启动时预加载参数快照(未初始化的数据库跳过)"""
+    with app.app_context():
+        if inspect(db.engine).has_table(Config.__tablename__):
+            get_snapshot()
@@ -0,0 +1,20 @@
+"""
+定时任务示例 - sys_job.invoke_target 可调用本模块中的函数
+如: app.tasks.no_params()、app.tasks.params('ry')、app.tasks.multiple_params('ry', True, 2000)
+"""
+from flask import current_app
+
+
+def no_params():
+    """无参任务"""
+    current_app.logger.info('执行无参方法')
+
+
+def params(value):
+    """有参任务"""
+    current_app.logger.info('执行有参方法：%s', value)
+
+
+def multiple_params(s, b, n):
+    """多参任务"""
+    current_app.logger.info('执行多参方法： 字符串类型%s，布尔类型%s，数值类型%s', s, b, n)
@@ -0,0 +1,374 @@
+"""
+用户批量导入 - 逐行读取CSV/XLSX并校验，每批的密码哈希在共享进程池中并行计算(少量时在当前进程计算)，
+用bulk_insert_mappings批量写入用户及用户角色、用户岗位关联，返回逐行错误报告
+用法:
+    python -m app.user_import users.xlsx
+    python -m app.user_import users.csv --password 123456 --report errors.csv
+"""
+import os
+import re
+import sys
+import csv
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+from app import versions
+from app.bulk import insert_links
+from app.models import db, User, Dept, Role, Post, user_role, user_post
+from app.dicts import get_dict
+from app.utils import validate_phone, validate_email, validate_password
+
+# 表头 -> 字段(兼容导出文件的表头，未列出的列忽略)
+IMPORT_COLUMNS = {
+    '登录名称': 'login_name',
+    '用户名称': 'user_name',
+    '部门编号': 'dept_id',
+    '部门名称': 'dept_name',
+    '用户邮箱': 'email',
+    '手机号码': 'phonenumber',
+    '用户性别': 'sex',
+    '帐号状态': 'status',
+    '初始密码': 'password',
+    '角色': 'roles',
+    '岗位': 'posts',
+    '备注': 'remark',
+}
+
+# 导入模板的表头
+TEMPLATE_HEADERS = ['登录名称', '用户名称', '部门编号', '用户邮箱', '手机号码', '用户性别', '帐号状态',
+                    '初始密码', '角色', '岗位', '备注']
+
+# 写入sys_user的字段
+_USER_FIELDS = ('login_name', 'user_name', 'dept_id', 'email', 'phonenumber', 'sex', 'status', 'remark')
+
+# 字段最大长度(与模型定义一致)
+_MAX_LENGTHS = {'login_name': 30, 'user_name': 30, 'email': 50, 'remark': 500}
+
+# 角色、岗位名称中可含空格，只按逗号、分号分隔
+_SPLIT = re.compile(r'[,，;；]+')
+
+
+class ImportReport:
+    """导入结果: 总行数、成功数和逐行错误(行号从表头所在的第1行算起)"""
+
+    def __init__(self, max_errors=1000):
+        self.total = 0
+        self.success = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, line, login_name, message):
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({'row': line, 'loginName': login_name, 'msg': message})
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'success': self.success,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'errorsTruncated': self.failed > len(self.errors),
+        }
+
+
+class _Lookups:
+    """校验用的部门、角色、岗位和字典数据(数据量小，一次加载)"""
+
+    def __init__(self):
+        depts = db.session.execute(select(Dept.dept_id, Dept.dept_name).where(Dept.del_flag == '0')).all()
+        self.dept_ids = {dept_id for dept_id, _ in depts}
+        names = {}
+        for dept_id, name in depts:
+            names.setdefault(name, []).append(dept_id)
+        # 只接受唯一的部门名称
+        self.dept_names = {name: ids[0] for name, ids in names.items() if len(ids) == 1}
+        self.roles = {}
+        for role_id, key, name in db.session.execute(
+                select(Role.role_id, Role.role_key, Role.role_name).where(Role.del_flag == '0')):
+            self.roles[key] = self.roles[name] = role_id
+        self.posts = {}
+        for post_id, code, name in db.session.execute(select(Post.post_id, Post.post_code, Post.post_name)):
+            self.posts[code] = self.posts[name] = post_id
+        self.sex = self._choices('sys_user_sex')
+        self.status = self._choices('sys_normal_disable')
+
+    @staticmethod
+    def _choices(dict_type):
+        """字典值和标签都可作为输入: 标签 -> 值"""
+        entry = get_dict(dict_type)
+        choices = {item.dict_value: item.dict_value for item in entry.items}
+        choices.update({item.dict_label: item.dict_value for item in entry.items})
+        return choices
+
+
+_hash_pool = None  # (进程ID, 进程数, ProcessPoolExecutor)
+_hash_pool_lock = threading.Lock()
+
+
+def _hash_context():
+    """
+    哈希进程的启动方式: Web进程中运行着审计、采样、在线会话等后台线程，fork会复制其他线程持有的锁，
+    子进程可能死锁，因此使用forkserver(不支持时为spawn)
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # 哈希进程只需werkzeug，forkserver不预先导入入口模块
+        context.set_forkserver_preload(['werkzeug.security'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _hash_executor(workers):
+    """进程内共享的密码哈希进程池，首次使用(或start_hash_pool)时创建，之后的导入复用"""
+    global _hash_pool
+    with _hash_pool_lock:
+        pool = _hash_pool
+        # gunicorn等fork出的worker不能使用父进程的进程池
+        if pool is None or pool[0] != os.getpid() or pool[1] != workers:
+            if pool is not None and pool[0] == os.getpid():
+                pool[2].shutdown(wait=False)
+            pool = _hash_pool = (os.getpid(), workers,
+                                 ProcessPoolExecutor(max_workers=workers, mp_context=_hash_context()))
+        return pool[2]
+
+
+def start_hash_pool(workers=0):
+    """预先启动哈希进程池，避免首次导入时在请求中等待进程启动"""
+    workers = workers or os.cpu_count() or 1
+    if workers > 1:
+        executor = _hash_executor(workers)
+        list(executor.map(len, [''] * workers))
+
+
+def hash_passwords(passwords, workers=0, inline_max=16):
+    """
+    计算密码哈希，不超过inline_max个或workers为1时在当前进程计算，否则使用共享进程池
+    :param workers: 进程数，0为CPU核数
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) <= inline_max:
+        return [generate_password_hash(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(_hash_executor(workers).map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+class UserImporter:
+    """
+    批量导入用户
+    :param operator: 创建者登录名
+    :param default_password: 未填写初始密码时使用的密码
+    :param chunk_size: 每批校验和写入的行数
+    :param workers: 密码哈希进程数，0为CPU核数
+    :param inline_max: 每批待写入的用户不超过此数时在当前进程计算密码哈希
+    """
+
+    def __init__(self, operator, default_password, chunk_size=1000, workers=0, max_errors=1000, inline_max=16):
+        self.operator = operator
+        self.default_password = default_password
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.inline_max = inline_max
+        self.report = ImportReport(max_errors)
+        self._seen = set()
+
+    def run(self, rows):
+        """rows为行迭代器(首行为表头)，返回ImportReport"""
+        rows = iter(rows)
+        header = next(rows, None)
+        if not header:
+            raise ValueError('文件内容为空')
+        columns = [IMPORT_COLUMNS.get(title.strip()) for title in header]
+        if 'login_name' not in columns or 'user_name' not in columns:
+            raise ValueError('缺少必填列: 登录名称、用户名称')
+
+        lookups = _Lookups()
+        chunk = []
+        for line, values in enumerate(rows, start=2):
+            if not any(values):
+                continue
+            self.report.total += 1
+            record = {field: value for field, value in zip(columns, values) if field}
+            candidate = self._validate(line, record, lookups)
+            if candidate is not None:
+                chunk.append(candidate)
+            if len(chunk) >= self.chunk_size:
+                self._write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk)
+        return self.report
+
+    def _validate(self, line, record, lookups):
+        """校验一行，返回 (行号, 用户字段, 密码, 角色ID, 岗位ID)，有错误时记录并返回None"""
+        errors = []
+        login_name = record.get('login_name', '')
+        for field, title in (('login_name', '登录名称'), ('user_name', '用户名称')):
+            if not record.get(field):
+                errors.append(f'{title}不能为空')
+        for field, length in _MAX_LENGTHS.items():
+            if len(record.get(field) or '') > length:
+                errors.append(f'{field}长度不能超过{length}个字符')
+        if login_name and login_name in self._seen:
+            errors.append('登录名称在文件中重复')
+        for validate, field in ((validate_email, 'email'), (validate_phone, 'phonenumber')):
+            valid, message = validate(record.get(field))
+            if not valid:
+                errors.append(message)
+
+        user = {field: record.get(field) or None for field in _USER_FIELDS}
+        user['sex'] = lookups.sex.get(record.get('sex') or '0')
+        if user['sex'] is None:
+            errors.append(f"用户性别无效: {record['sex']}")
+        user['status'] = lookups.status.get(record.get('status') or '0')
+        if user['status'] is None:
+            errors.append(f"帐号状态无效: {record['status']}")
+
+        user['dept_id'] = None
+        if record.get('dept_id'):
+            if record['dept_id'].isdigit() and int(record['dept_id']) in lookups.dept_ids:
+                user['dept_id'] = int(record['dept_id'])
+            else:
+                errors.append(f"部门编号不存在: {record['dept_id']}")
+        elif record.get('dept_name'):
+            user['dept_id'] = lookups.dept_names.get(record['dept_name'])
+            if user['dept_id'] is None:
+                errors.append(f"部门名称不存在或不唯一: {record['dept_name']}")
+
+        role_ids, post_ids = set(), set()
+        for field, title, mapping, ids in (('roles', '角色', lookups.roles, role_ids),
+                                           ('posts', '岗位', lookups.posts, post_ids)):
+            for name in _SPLIT.split(record.get(field) or ''):
+                name = name.strip()
+                if not name:
+                    continue
+                if name in mapping:
+                    ids.add(mapping[name])
+                else:
+                    errors.append(f'{title}不存在: {name}')
+
+        password = record.get('password') or self.default_password
+        valid, message = validate_password(password)
+        if not valid:
+            errors.append(message)
+
+        if login_name:
+            self._seen.add(login_name)
+        if errors:
+            self.report.error(line, login_name, '; '.join(errors))
+            return None
+        return line, user, password, role_ids, post_ids
+
+    def _write_chunk(self, chunk):
+        """排除已存在的登录名，计算密码哈希后批量写入一批用户"""
+        names = [user['login_name'] for _, user, _, _, _ in chunk]
+        existing = set(db.session.scalars(select(User.login_name).where(User.login_name.in_(names))))
+        pending = []
+        for candidate in chunk:
+            line, user = candidate[0], candidate[1]
+            if user['login_name'] in existing:
+                self.report.error(line, user['login_name'], '登录名称已存在')
+            else:
+                pending.append(candidate)
+        if not pending:
+            return
+
+        hashes = hash_passwords([password for _, _, password, _, _ in pending], self.workers, self.inline_max)
+        now = datetime.now()
+        mappings = []
+        for (_, user, _, _, _), password_hash in zip(pending, hashes):
+            mappings.append(dict(user, password=password_hash, pwd_update_date=now, del_flag='0',
+                                 user_type='00', create_by=self.operator, create_time=now))
+        try:
+            self._insert(pending, mappings)
+        except IntegrityError:
+            # 并发导入等情况导致的冲突: 逐行写入以定位出错的行
+            db.session.rollback()
+            for mapping in mappings:
+                # 失败的批量写入已由return_defaults回填主键，逐行写入时须重新生成
+                mapping.pop('user_id', None)
+            for candidate, mapping in zip(pending, mappings):
+                try:
+                    self._insert([candidate], [mapping])
+                except IntegrityError as e:
+                    db.session.rollback()
+                    self.report.error(candidate[0], mapping['login_name'], f'写入失败: {e.orig}')
+
+    def _insert(self, candidates, mappings):
+        db.session.bulk_insert_mappings(User, mappings, return_defaults=True)
+        role_links, post_links = [], []
+        for (_, _, _, role_ids, post_ids), mapping in zip(candidates, mappings):
+            role_links.extend({'user_id': mapping['user_id'], 'role_id': role_id} for role_id in role_ids)
+            post_links.extend({'user_id': mapping['user_id'], 'post_id': post_id} for post_id in post_ids)
+        insert_links(user_role, role_links)
+        insert_links(user_post, post_links)
+        db.session.commit()
+        # bulk_insert_mappings不经过flush事件，需手动递增版本号使缓存失效
+        versions.bump(User.__tablename__)
+        self.report.success += len(mappings)
+
+
+def import_users(rows, operator, default_password, config):
+    """按应用配置导入用户，返回ImportReport"""
+    importer = UserImporter(
+        operator, default_password,
+        chunk_size=config.get('IMPORT_CHUNK_SIZE', 1000),
+        workers=config.get('IMPORT_HASH_WORKERS', 0),
+        max_errors=config.get('IMPORT_MAX_ERRORS', 1000),
+        inline_max=config.get('IMPORT_HASH_INLINE_MAX', 16),
+    )
+    return importer.run(rows)
+
+
+def write_report(report, path):
+    """错误报告写入CSV"""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['行号', '登录名称', '错误信息'])
+        for error in report.to_dict()['errors']:
+            writer.writerow([error['row'], error['loginName'], error['msg']])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量导入用户(CSV/XLSX)')
+    parser.add_argument('file', help='导入文件(.csv或.xlsx)')
+    parser.add_argument('--config', default=os.environ.get('FLASK_CONFIG', 'default'), help='应用配置名')
+    parser.add_argument('--operator', default='admin', help='创建者登录名')
+    parser.add_argument('--password', help='默认初始密码，默认取参数sys.user.initPassword')
+    parser.add_argument('--workers', type=int, help='密码哈希进程数，默认CPU核数')
+    parser.add_argument('--report', help='错误报告输出路径(CSV)')
+    options = parser.parse_args()
+
+    from app import create_app
+    from app.export import read_rows
+    from app.sysconfig import get_config
+    app = create_app(options.config)
+    if options.workers is not None:
+        app.config['IMPORT_HASH_WORKERS'] = options.workers
+    # 命令行输出全部错误
+    app.config['IMPORT_MAX_ERRORS'] = None
+    with app.app_context(), open(options.file, 'rb') as f:
+        password = options.password or get_config('sys.user.initPassword', '123456')
+        try:
+            report = import_users(read_rows(f, options.file), options.operator, password, app.config)
+        except ValueError as e:
+            print(f'导入失败: {e}', file=sys.stderr)
+            return 2
+    print(f'共 {report.total} 行，成功 {report.success} 行，失败 {report.failed} 行')
+    if options.report:
+        write_report(report, options.report)
+        print(f'错误报告已写入 {options.report}')
+    else:
+        for error in report.to_dict()['errors']:
+            print(f"第{error['row']}行 {error['loginName']}: {error['msg']}")
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
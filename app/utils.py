@@ -2,12 +2,15 @@
 工具函数模块
 """
 import re
+import json
+import base64
 import hashlib
 from datetime import datetime
 from functools import wraps
 from flask import request, jsonify
 from flask_login import current_user
-from app.models import DictData
+from app import dicts
+from app.models import db
 
 
 def get_client_ip():
@@ -56,23 +59,13 @@ def parse_user_agent(ua_string):
 
 
 def get_dict_label(dict_type, dict_value):
-    """根据字典类型和值获取标签"""
-    if not dict_value:
-        return ''
-    dict_data = DictData.query.filter_by(
-        dict_type=dict_type,
-        dict_value=str(dict_value),
-        status='0'
-    ).first()
-    return dict_data.dict_label if dict_data else dict_value
+    """根据字典类型和值获取标签(读取字典缓存)"""
+    return dicts.get_label(dict_type, dict_value)
 
 
 def get_dict_list(dict_type):
-    """获取字典数据列表"""
-    return DictData.query.filter_by(
-        dict_type=dict_type,
-        status='0'
-    ).order_by(DictData.dict_sort).all()
+    """获取字典数据列表(读取字典缓存)"""
+    return list(dicts.get_dict(dict_type).items)
 
 
 def format_datetime(value, format='%Y-%m-%d %H:%M:%S'):
@@ -98,17 +91,19 @@ def error_response(msg='操作失败', code=500, **kwargs):
     return jsonify(result)
 
 
-def table_response(rows, total=None):
-    """表格数据响应"""
+def table_response(rows, total=None, **kwargs):
+    """表格数据响应(kwargs为附加字段，如游标分页的nextCursor/prevCursor)"""
     if total is None:
         total = len(rows) if isinstance(rows, list) else rows.count()
     
-    return jsonify({
+    result = {
         'code': 0,
         'msg': '查询成功',
         'rows': rows if isinstance(rows, list) else [item.to_dict() for item in rows],
         'total': total
-    })
+    }
+    result.update(kwargs)
+    return jsonify(result)
 
 
 def paginate(query, page, per_page):
@@ -121,6 +116,106 @@ def paginate(query, page, per_page):
     return pagination.items, pagination.total
 
 
+def encode_cursor(values, direction='next'):
+    """将排序键值编码为不透明游标"""
+    data = {
+        'd': direction,
+        'k': [{'t': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    }
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def _cursor_value(value, column):
+    """按排序列类型还原游标键值，类型不符时抛出ValueError"""
+    python_type = column.type.python_type
+    if python_type is datetime:
+        if not isinstance(value, dict) or not isinstance(value.get('t'), str):
+            raise ValueError('invalid cursor value')
+        return datetime.fromisoformat(value['t'])
+    if python_type is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError('invalid cursor value')
+        return value
+    if not isinstance(value, python_type):
+        raise ValueError('invalid cursor value')
+    return value
+
+
+def decode_cursor(cursor, columns):
+    """解码游标并按排序列校验键值个数和类型，返回 (键值列表, 方向)，无效游标返回 (None, 'next')"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        keys = data['k']
+        if not isinstance(keys, list) or len(keys) != len(columns):
+            raise ValueError('invalid cursor length')
+        values = [_cursor_value(value, column) for value, column in zip(keys, columns)]
+        direction = 'prev' if data.get('d') == 'prev' else 'next'
+        return values, direction
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None, 'next'
+
+
+def keyset_paginate(query, columns, cursor, per_page):
+    """
+    游标(keyset)分页查询，按columns降序排列，columns末列须唯一(如主键)
+    不使用OFFSET和COUNT，任意页的开销与第一页相同
+    :param query: 查询对象(不含排序)
+    :param columns: 排序列列表，如 [OperLog.oper_time, OperLog.oper_id]
+    :param cursor: 上一次返回的nextCursor/prevCursor，为空时查询第一页
+    :param per_page: 每页条数
+    :return: (items, next_cursor, prev_cursor)
+    """
+    values, direction = decode_cursor(cursor, columns) if cursor else (None, 'next')
+    backward = direction == 'prev'
+    
+    if values is not None:
+        # 按字典序比较: (c1 < v1) OR (c1 = v1 AND c2 < v2) ...
+        conditions = []
+        for i, column in enumerate(columns):
+            compare = column > values[i] if backward else column < values[i]
+            equals = [columns[j] == values[j] for j in range(i)]
+            conditions.append(db.and_(*equals, compare))
+        query = query.filter(db.or_(*conditions))
+    else:
+        values = None
+    
+    ordering = [c.asc() for c in columns] if backward else [c.desc() for c in columns]
+    items = query.order_by(*ordering).limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if backward:
+        items.reverse()
+    
+    def key_of(item):
+        return [getattr(item, column.key) for column in columns]
+    
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or backward:
+            next_cursor = encode_cursor(key_of(items[-1]), 'next')
+        if values is not None and (has_more or not backward):
+            prev_cursor = encode_cursor(key_of(items[0]), 'prev')
+    return items, next_cursor, prev_cursor
+
+
+def estimate_total(pk_column):
+    """
+    估算表行数(取最大主键，走主键索引，不做全表COUNT)
+    适用于只追加、极少删除的日志表
+    """
+    return db.session.query(db.func.max(pk_column)).scalar() or 0
+
+
+def cursor_total(query, pk_column, exact=False):
+    """
+    游标分页的总数: 要求精确值或查询带有过滤条件时COUNT，
+    否则用estimate_total估算(最大主键反映的是整表行数，不适用于过滤后的结果)
+    """
+    if exact or query.whereclause is not None:
+        return query.count()
+    return estimate_total(pk_column)
+
+
 def has_permission(permission):
     """检查当前用户是否有指定权限"""
     if not current_user.is_authenticated:
@@ -128,23 +223,43 @@ def has_permission(permission):
     return current_user.has_permission(permission)
 
 
-def build_tree(items, parent_id=0, id_field='id', parent_field='parent_id', children_field='children'):
+def build_tree(items, parent_id=0, id_field='id', parent_field='parent_id', children_field='children',
+               sort_field=None, keep_empty=False):
     """
-    构建树形结构
+    构建树形结构(单遍建立父节点索引，迭代组装，无递归深度限制)
     :param items: 数据列表(字典列表)
     :param parent_id: 父节点ID
     :param id_field: ID字段名
     :param parent_field: 父ID字段名
     :param children_field: 子节点字段名
+    :param sort_field: 同级排序字段名(稳定排序)，为None时保持原顺序
+    :param keep_empty: 无子节点时是否保留空的子节点列表
     :return: 树形结构列表
     """
-    tree = []
+    if sort_field:
+        items = sorted(items, key=lambda item: item.get(sort_field) or 0)
+    
+    # 按父ID分组
+    children_map = {}
     for item in items:
-        if item.get(parent_field) == parent_id:
-            children = build_tree(items, item[id_field], id_field, parent_field, children_field)
-            if children:
-                item[children_field] = children
-            tree.append(item)
+        children_map.setdefault(item.get(parent_field), []).append(item)
+    
+    tree = children_map.get(parent_id, [])
+    stack = list(tree)
+    visited = set()
+    while stack:
+        item = stack.pop()
+        item_id = item[id_field]
+        if item_id in visited:
+            # 数据存在环时不重复展开
+            continue
+        visited.add(item_id)
+        children = children_map.get(item_id)
+        if children:
+            item[children_field] = children
+            stack.extend(children)
+        elif keep_empty:
+            item[children_field] = []
     return tree
 
 
@@ -204,15 +319,18 @@ def get_ancestors(dept_id, dept_dict):
     """
     ancestors = []
     current_id = dept_id
+    visited = set()
     
-    while current_id and current_id in dept_dict:
+    # 上级部门数据有环时在回到已访问的部门处停止
+    while current_id and current_id in dept_dict and current_id not in visited:
+        visited.add(current_id)
         dept = dept_dict[current_id]
         parent_id = dept.get('parent_id', 0)
         if parent_id:
             ancestors.insert(0, str(parent_id))
         current_id = parent_id
     
-    return ','.join(ancestors) if ancestors else '0'
+    return ','.join(['0'] + ancestors)
 
 
 def allowed_file(filename, allowed_extensions):
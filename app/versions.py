@@ -0,0 +1,90 @@
+"""
+数据版本号 - 按表记录数据变更版本，供进程内缓存做失效判断
+"""
+import threading
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+_lock = threading.Lock()
+_versions = {}
+_listeners = []
+_registered = False
+
+# session.info中记录本事务已修改表名的键
+_TOUCHED_KEY = '_touched_tables'
+
+
+def table_version(*tables):
+    """获取指定表的当前版本号(元组)，任一表变更后版本号都会变化"""
+    return tuple(_versions.get(table, 0) for table in tables)
+
+
+def known_tables():
+    """本进程记录过版本号的表"""
+    return list(_versions)
+
+
+def bump(*tables):
+    """递增指定表的版本号，并通知监听者"""
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+    for func in _listeners:
+        func(tables)
+
+
+def add_listener(func):
+    """注册版本变更回调，func(tables)在提交事务的线程中调用，应尽快返回"""
+    _listeners.append(func)
+
+
+def _touched(session):
+    return session.info.setdefault(_TOUCHED_KEY, set())
+
+
+def _collect_flush_tables(session, flush_context):
+    """flush后收集本次修改涉及的表(含多对多关联表)"""
+    tables = _touched(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        state = inspect(obj)
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        mapper = state.mapper
+        tables.add(mapper.local_table.name)
+        for rel in mapper.relationships:
+            if rel.secondary is None:
+                continue
+            if obj in session.deleted or state.attrs[rel.key].history.has_changes():
+                tables.add(rel.secondary.name)
+
+
+def _collect_execute_tables(orm_execute_state):
+    """收集通过session.execute/Query.update/Query.delete直接执行的写语句涉及的表"""
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    name = getattr(table, 'name', None)
+    if name is None and orm_execute_state.bind_mapper is not None:
+        name = orm_execute_state.bind_mapper.local_table.name
+    if name:
+        _touched(orm_execute_state.session).add(name)
+
+
+def _flush_versions(session):
+    """事务结束时递增已修改表的版本号"""
+    tables = session.info.pop(_TOUCHED_KEY, None)
+    if tables:
+        bump(*tables)
+
+
+def register_version_listeners():
+    """注册SQLAlchemy事件监听(只注册一次)"""
+    global _registered
+    if _registered:
+        return
+    event.listen(Session, 'after_flush', _collect_flush_tables)
+    event.listen(Session, 'do_orm_execute', _collect_execute_tables)
+    event.listen(Session, 'after_commit', _flush_versions)
+    # 回滚前可能已有缓存读取到未提交数据，同样递增版本号
+    event.listen(Session, 'after_rollback', _flush_versions)
+    _registered = True
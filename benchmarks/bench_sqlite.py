@@ -0,0 +1,123 @@
+"""
+SQLite读写并发性能测试
+对比默认PRAGMA(回滚日志、synchronous=FULL)与config.Config中的调优设置:
+多个读线程执行列表查询，同时写线程逐条提交登录日志(模拟登录)，统计各自吞吐量
+用法: python benchmarks/bench_sqlite.py [--seconds 5] [--readers 8] [--writers 2]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import create_engine, select, insert, func
+from sqlalchemy.exc import OperationalError
+from config import Config
+from app.models import db, OperLog, LoginInfo
+from app.database import SQLITE_PRAGMAS, engine_options, sqlite_pragmas, set_sqlite_pragmas
+
+SEED_ROWS = 20000
+
+
+def settings(tuned):
+    """调优设置取自Config，默认设置将所有SQLite配置置空"""
+    keys = [key for _, key in SQLITE_PRAGMAS] + ['SQLITE_POOL_CLASS', 'SQLITE_POOL_SIZE',
+                                                 'SQLITE_MAX_OVERFLOW', 'SQLITE_POOL_TIMEOUT']
+    if tuned:
+        return {key: getattr(Config, key) for key in keys}
+    return {key: None for key in keys} | {'SQLITE_POOL_SIZE': 5, 'SQLITE_MAX_OVERFLOW': 10,
+                                          'SQLITE_POOL_TIMEOUT': 30}
+
+
+def make_engine(path, config):
+    uri = f'sqlite:///{path}'
+    engine = create_engine(uri, **engine_options(config, uri))
+    set_sqlite_pragmas(engine, sqlite_pragmas(config, uri))
+    return engine
+
+
+def seed(engine):
+    db.metadata.create_all(engine, tables=[OperLog.__table__, LoginInfo.__table__])
+    now = datetime.now()
+    rows = [{'title': '用户管理', 'business_type': i % 4, 'oper_name': f'user{i % 50}',
+             'oper_url': '/system/user/edit', 'status': 0, 'oper_time': now} for i in range(SEED_ROWS)]
+    with engine.begin() as conn:
+        conn.execute(insert(OperLog), rows)
+
+
+def run(engine, seconds, readers, writers):
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    read_latency = []
+
+    def add(name, n=1):
+        with lock:
+            counts[name] += n
+
+    def reader():
+        list_query = select(OperLog).order_by(OperLog.oper_time.desc(), OperLog.oper_id.desc()).limit(10)
+        count_query = select(func.count()).select_from(OperLog)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(list_query).all()
+                    conn.execute(count_query).scalar()
+                add('reads')
+                with lock:
+                    read_latency.append(time.perf_counter() - start)
+            except OperationalError:
+                add('errors')
+
+    def writer():
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(LoginInfo), {'login_name': 'admin', 'ipaddr': '127.0.0.1',
+                                                     'status': '0', 'msg': '登录成功',
+                                                     'login_time': datetime.now()})
+                add('writes')
+            except OperationalError:
+                add('errors')
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    read_latency.sort()
+    p99 = read_latency[int(len(read_latency) * 0.99)] * 1000 if read_latency else 0.0
+    return counts['reads'] / seconds, counts['writes'] / seconds, counts['errors'], p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite读写并发性能测试')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    options = parser.parse_args()
+
+    print(f'{options.readers}个读线程 / {options.writers}个写线程 / 每组{options.seconds}秒')
+    print(f"{'设置':<8}{'读/秒':>10}{'写/秒':>10}{'错误':>8}{'读p99(ms)':>12}")
+    for name, tuned in (('默认', False), ('调优', True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = make_engine(os.path.join(tmp, 'bench.db'), settings(tuned))
+            seed(engine)
+            reads, writes, errors, p99 = run(engine, options.seconds, options.readers, options.writers)
+            engine.dispose()
+        print(f'{name:<8}{reads:>10.1f}{writes:>10.1f}{errors:>8}{p99:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
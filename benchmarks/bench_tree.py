@@ -0,0 +1,56 @@
+"""
+树构建性能测试
+验证app.utils.build_tree随节点数线性增长(1千到10万节点)
+用法: python benchmarks/bench_tree.py
+"""
+import os
+import sys
+import random
+import time
+
+# 添加项目根目录到Python路径
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from app.utils import build_tree
+
+
+def make_items(count, seed=0):
+    """生成随机树节点，每个节点的父节点为之前生成的任一节点"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(1, count + 1):
+        parent_id = rng.randint(0, i - 1)
+        items.append({'id': i, 'parent_id': parent_id, 'order_num': rng.randint(0, 100)})
+    return items
+
+
+def make_chain(count):
+    """生成单链节点(最大深度)，递归实现会超过递归深度限制"""
+    return [{'id': i, 'parent_id': i - 1, 'order_num': 0} for i in range(1, count + 1)]
+
+
+def bench(items, repeat=3, **kwargs):
+    best = None
+    for _ in range(repeat):
+        data = [dict(item) for item in items]
+        start = time.perf_counter()
+        build_tree(data, 0, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print(f'{"节点数":>10} {"耗时(ms)":>12} {"每节点(us)":>12}')
+    for count in (1000, 10000, 50000, 100000):
+        elapsed = bench(make_items(count), sort_field='order_num')
+        print(f'{count:>10} {elapsed * 1000:>12.2f} {elapsed / count * 1e6:>12.3f}')
+    
+    count = 100000
+    elapsed = bench(make_chain(count))
+    print(f'单链深度{count}: {elapsed * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
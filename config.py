@@ -17,6 +17,25 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(BASE_DIR, "database", "dntest.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # 生产环境设为False
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')  # 只读库地址，为空时全部读写走主库
+    REPLICA_STICKY_SECONDS = 5  # 用户写入后多少秒内只读接口仍读主库(大于复制延迟)
+    DATABASE_AUTO_UPGRADE = True  # 启动时为已有数据库补建新增的表、列和索引(python -m app.migrate)
+    
+    # SQLite连接配置(值为None时保持SQLite默认)
+    SQLITE_JOURNAL_MODE = 'WAL'  # 写入不阻塞读取
+    SQLITE_SYNCHRONOUS = 'NORMAL'  # WAL模式下NORMAL不会损坏数据库，仅断电时可能丢失最近提交
+    SQLITE_BUSY_TIMEOUT = 5000  # 数据库被锁定时等待的毫秒数
+    SQLITE_CACHE_SIZE = -20000  # 每个连接的页缓存，负数单位为KB(约20MB)
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # 内存映射读取的字节数
+    SQLITE_TEMP_STORE = 'MEMORY'  # 临时表和排序使用内存
+    SQLITE_POOL_CLASS = 'QueuePool'  # 连接池类型: QueuePool / NullPool / StaticPool / SingletonThreadPool
+    SQLITE_POOL_SIZE = 10  # 常驻连接数(不少于服务线程数)
+    SQLITE_MAX_OVERFLOW = 20  # 超出常驻连接数后最多再创建的连接数
+    SQLITE_POOL_TIMEOUT = 30  # 获取连接的最长等待秒数
+    
+    # 搜索配置(用户/角色/岗位的全文索引)
+    SEARCH_ANALYZE_ON_START = True  # 启动时抽样更新搜索表统计信息
+    SEARCH_ANALYSIS_LIMIT = 1000  # ANALYZE每个索引抽样的行数
     
     # 会话配置
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)  # 会话超时时间
@@ -28,6 +47,74 @@ class Config:
     PAGE_SIZE = 10
     MAX_PAGE_SIZE = 100
     
+    # 缓存配置
+    CACHE_LOCAL_SIZE = 1024  # 进程内缓存条目数(字典、权限、菜单树等)
+    CACHE_LOCAL_TTL = 300  # 进程内缓存过期秒数(兜底，正常由数据版本号失效)
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')  # 共享缓存地址，如redis://127.0.0.1:6379/0，为空时只用进程内缓存
+    CACHE_REDIS_TIMEOUT = 1.0  # 共享缓存连接/读写超时秒数
+    CACHE_SHARED_TTL = 3600  # 共享缓存过期秒数
+    CACHE_KEY_PREFIX = 'dntest:'  # 共享缓存键前缀(失效通知频道为 前缀+invalidate)
+    CACHE_RETRY_INTERVAL = 5.0  # 共享缓存出错后多少秒内只用进程内缓存
+    
+    # 审计日志异步写入配置
+    AUDIT_ASYNC = True  # False时同步写入(测试/脚本)
+    AUDIT_BATCH_SIZE = 200  # 每批最多写入条数
+    AUDIT_FLUSH_INTERVAL = 1.0  # 最长等待秒数
+    AUDIT_QUEUE_SIZE = 10000  # 队列容量，满时丢弃并计数
+    AUDIT_PUT_TIMEOUT = 0.05  # 队列满时最长阻塞秒数
+    OPER_LOG_MAX_LENGTH = 2000  # 操作日志参数/结果最大保存长度
+    
+    # 在线会话配置
+    ONLINE_FLUSH_INTERVAL = 60  # 最后访问时间批量写入间隔(秒)，也是强退在其他worker进程上生效的最长延迟
+    ONLINE_SWEEP_INTERVAL = 60  # 过期会话清理间隔(秒)
+    ONLINE_REVOKE_GRACE = 30  # 登录后多少秒内不因在线记录缺失判定为强退(等待异步写入)
+    ONLINE_MULTI_SESSION = False  # True时每次登录各自一条在线记录，登出只删除当前会话；False时新登录替换该账号原有记录，登出删除该账号全部记录
+    
+    # 服务器监控采样配置
+    SERVER_SAMPLE_INTERVAL = 5.0  # 采样间隔(秒)
+    SERVER_SAMPLE_HISTORY = 720  # 环形缓冲区保留的快照数(默认1小时)
+    SERVER_SAMPLE_DISK_PATH = '/'  # 磁盘使用率统计路径
+    METRICS_STORE_ENABLED = True  # 是否保存指标历史
+    METRICS_DB_PATH = os.path.join(BASE_DIR, 'database', 'metrics.db')
+    METRICS_RETENTION_RAW = 24 * 3600  # 原始数据保留1天
+    METRICS_RETENTION_MINUTE = 7 * 24 * 3600  # 分钟汇总保留7天
+    METRICS_RETENTION_HOUR = 365 * 24 * 3600  # 小时汇总保留1年
+    
+    # 定时任务配置
+    SCHEDULER_ENABLED = True  # 是否启动定时任务调度
+    SCHEDULER_POOL_SIZE = 10  # 任务执行线程数
+    SCHEDULER_MISFIRE_GRACE = 1.0  # 超过计划时间多少秒视为错过触发
+    SCHEDULER_ALLOWED_TARGETS = ['app.tasks']  # 允许调用的模块白名单
+    SCHEDULER_LEASE_ENABLED = True  # 多进程部署时通过数据库租约保证每次触发只执行一次
+    SCHEDULER_LEASE_TIMEOUT = 30  # 租约心跳超时秒数，超时后由其他进程接管
+    SCHEDULER_LEASE_HEARTBEAT = 10  # 心跳间隔秒数
+    SCHEDULER_LEASE_RETENTION = 24 * 3600  # 已完成租约保留秒数
+    
+    # 响应压缩和条件请求配置
+    RESPONSE_COMPRESS_ENABLED = True  # 压缩JSON响应(gzip，安装brotli后优先br)
+    RESPONSE_COMPRESS_MIN_SIZE = 1024  # 小于该字节数的响应不压缩
+    RESPONSE_GZIP_LEVEL = 6
+    RESPONSE_BROTLI_LEVEL = 4
+    ETAG_ENABLED = True  # 列表接口根据数据版本号返回ETag，未变化时返回304
+    ETAG_MAX_AGE = 60  # ETag最长有效秒数(兜底其他进程未通知到的修改)，0为不限制
+    
+    # 导出配置
+    EXPORT_BATCH_SIZE = 1000  # 每批从数据库读取的行数(yield_per)
+    EXPORT_CHUNK_ROWS = 1000  # 每写入多少行发送一次
+    
+    # 导入配置
+    IMPORT_CHUNK_SIZE = 1000  # 每批校验并写入的行数
+    IMPORT_HASH_WORKERS = 0  # 密码哈希进程数，0为CPU核数，1为不使用进程池
+    IMPORT_HASH_INLINE_MAX = 16  # 每批待写入用户不超过此数时在当前进程计算密码哈希
+    IMPORT_HASH_PREWARM = False  # 启动时预先创建哈希进程池(每个worker进程各一个)
+    IMPORT_MAX_ERRORS = 1000  # 接口返回的错误明细最大条数
+    
+    # 批量修改配置
+    BULK_CHUNK_SIZE = 500  # 批量删除/修改时每条语句绑定的ID个数(SQLite旧版本最多999个参数)
+    
+    # 静态资源配置
+    ASSETS_MANIFEST_ENABLED = True  # 存在static/dist/manifest.json时使用带哈希的文件名(python -m app.assets构建)
+    
     # 上传配置
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 最大上传10MB
@@ -64,6 +151,7 @@ class Config:
 class DevelopmentConfig(Config):
     """开发环境配置"""
     DEBUG = True
+    ASSETS_MANIFEST_ENABLED = False  # 开发时直接使用源文件，修改后无需重新构建
     SQLALCHEMY_ECHO = True
     LOG_LEVEL = 'DEBUG'
 
@@ -80,6 +168,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    AUDIT_ASYNC = False
+    METRICS_STORE_ENABLED = False
+    SCHEDULER_ENABLED = False
 
 
 # 配置字典
@@ -2,6 +2,7 @@
 应用启动文件
 """
 import os
+import multiprocessing
 from app import create_app
 
 # 从环境变量获取配置，默认为development
@@ -10,6 +11,23 @@ config_name = os.environ.get('FLASK_CONFIG', 'development')
 # 创建应用实例
 app = create_app(config_name)
 
+# 以spawn/forkserver启动的子进程(如密码哈希进程池)会重新导入本模块，不在其中启动后台任务
+main_process = multiprocessing.parent_process() is None
+
+# 启动定时任务调度(调试模式下只在重载器子进程中启动)
+if main_process and app.config.get('SCHEDULER_ENABLED') and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    from app.scheduler import job_scheduler
+    job_scheduler.start()
+
+# 启用指标历史时在启动时开始采样，重启后无需等待有人打开服务监控页面
+if main_process and app.config.get('METRICS_STORE_ENABLED') and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    from app.metrics import server_sampler
+    server_sampler.start()
+
+if main_process and app.config.get('IMPORT_HASH_PREWARM') and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    from app.user_import import start_hash_pool
+    start_hash_pool(app.config['IMPORT_HASH_WORKERS'])
+
 if __name__ == '__main__':
     # 开发环境启动配置
     app.run(